@@ -1,6 +1,8 @@
 from . import redact
 from . import merge
 from . import tree
+from . import intervals
+from .eventframe import EventFrame
 from .util import (
     split_event_on_time,
     next_hour,
@@ -11,7 +13,11 @@ from .util import (
     is_in_same_week,
     split_into_weeks,
     split_into_days,
+    iter_periods,
     verify_no_overlap,
+    compute_total_overlap,
+    find_overlaps,
     categorytime_per_day,
     categorytime_during_day,
+    bin_durations,
 )  # noqa
@@ -0,0 +1,255 @@
+"""
+An on-disk archive of fetched (and classified) events, as columnar files
+partitioned by host and day (UTC).
+
+Each day is a directory of chunks, one per import, which ``compact`` merges into
+one. A chunk stores the arrays of an ``EventFrame`` as .npy files, which are
+memory-mapped when read, so reading only touches the days and columns it needs:
+
+    <root>/<hostname>/<YYYY-MM-DD>/<chunk>/
+        meta.json                  period covered, columns, rules fingerprint
+        start.npy, duration.npy    int64 microseconds
+        <column>.codes.npy         int32 codes into the values
+        <column>.values.json       distinct values
+"""
+
+import argparse
+import json
+import logging
+import os
+import shutil
+import socket
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+from urllib.parse import quote
+
+import numpy as np
+from aw_client import ActivityWatchClient
+from aw_core.models import Event
+
+from . import classify
+from .eventframe import EventFrame
+from .util import iter_periods, start_of_day
+
+logger = logging.getLogger(__name__)
+
+archive_dir = "./data/archive"
+
+
+def _day_dir(root: str, hostname: str, day: date) -> str:
+    return os.path.join(root, hostname, day.isoformat())
+
+
+def _chunks(day_dir: str) -> List[str]:
+    if not os.path.isdir(day_dir):
+        return []
+    names = sorted(n for n in os.listdir(day_dir) if not n.endswith(".tmp"))
+    return [os.path.join(day_dir, n) for n in names]
+
+
+def write_chunk(path: str, frame: EventFrame, meta: dict) -> None:
+    """Writes a frame to the chunk directory ``path``, which appears atomically"""
+    tmp = path + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    np.save(os.path.join(tmp, "start.npy"), frame.start)
+    np.save(os.path.join(tmp, "duration.npy"), frame.duration)
+    for name, (codes, values) in frame.columns.items():
+        np.save(os.path.join(tmp, f"{quote(name, safe='')}.codes.npy"), codes)
+        with open(os.path.join(tmp, f"{quote(name, safe='')}.values.json"), "w") as f:
+            json.dump(values.tolist(), f)
+    with open(os.path.join(tmp, "meta.json"), "w") as f:
+        json.dump({**meta, "columns": list(frame.columns), "n": len(frame)}, f)
+    os.replace(tmp, path)
+
+
+def read_chunk(path: str, columns: Optional[Sequence[str]] = None) -> EventFrame:
+    """Reads a chunk memory-mapped, with only ``columns`` (default: all)"""
+    meta = _read_meta(path)
+    frame_columns = {}
+    for name in meta["columns"]:
+        if columns is not None and name not in columns:
+            continue
+        prefix = os.path.join(path, quote(name, safe=""))
+        with open(f"{prefix}.values.json") as f:
+            values = np.array(json.load(f), dtype=object)
+        codes = np.load(f"{prefix}.codes.npy", mmap_mode="r")
+        frame_columns[name] = (codes, values)
+    return EventFrame(
+        np.load(os.path.join(path, "start.npy"), mmap_mode="r"),
+        np.load(os.path.join(path, "duration.npy"), mmap_mode="r"),
+        frame_columns,
+    )
+
+
+def _read_meta(path: str) -> dict:
+    with open(os.path.join(path, "meta.json")) as f:
+        return json.load(f)
+
+
+def iter_days(
+    hostname: str,
+    start: date,
+    end: date,
+    columns: Optional[Sequence[str]] = None,
+    root: str = archive_dir,
+) -> Iterator[Tuple[date, EventFrame]]:
+    """
+    Yields the archived events of each day from ``start`` until ``end``
+    (exclusive). The arrays of compacted days are memory-mapped, days with
+    several chunks are concatenated.
+    """
+    day = start
+    while day < end:
+        frames = [
+            read_chunk(path, columns) for path in _chunks(_day_dir(root, hostname, day))
+        ]
+        if frames:
+            yield day, frames[0] if len(frames) == 1 else EventFrame.concat(frames)
+        day += timedelta(days=1)
+
+
+def load(
+    hostname: str,
+    start: date,
+    end: date,
+    columns: Optional[Sequence[str]] = None,
+    root: str = archive_dir,
+) -> EventFrame:
+    """Returns the archived events from ``start`` until ``end`` (exclusive) in one frame"""
+    frames = [frame for _, frame in iter_days(hostname, start, end, columns, root)]
+    if not frames:
+        return EventFrame(np.zeros(0), np.zeros(0))
+    return frames[0] if len(frames) == 1 else EventFrame.concat(frames)
+
+
+def _archived_until(day_dir: str, day_start: datetime) -> datetime:
+    until = day_start
+    for path in _chunks(day_dir):
+        until = max(until, datetime.fromisoformat(_read_meta(path)["until"]))
+    return until
+
+
+def _next_chunk(day_dir: str) -> str:
+    chunks = _chunks(day_dir)
+    i = int(os.path.basename(chunks[-1])) + 1 if chunks else 0
+    return os.path.join(day_dir, f"{i:04d}")
+
+
+def _classify(frame: EventFrame) -> Tuple[EventFrame, Optional[str]]:
+    """Classifies the frame if rules are loaded, returns it with the rules fingerprint"""
+    if classify.classifier is None:
+        return frame, None
+    return classify.classify(frame), classify.classifier.fingerprint
+
+
+def import_events(
+    awc: ActivityWatchClient,
+    hostname: str,
+    since: datetime,
+    end: datetime,
+    root: str = archive_dir,
+    jobs: int = 4,
+) -> int:
+    """
+    Fetches the events of ``hostname`` that aren't archived yet into the
+    archive, classified with the loaded rules (if any). Days are only fetched
+    since where the previous import stopped. Returns the number of new events.
+    """
+    since = since.astimezone(timezone.utc)
+    end = end.astimezone(timezone.utc)
+    fetch_until = datetime.now(timezone.utc) - classify._segment_grace
+
+    todo: Dict[datetime, datetime] = {}
+    for day, _ in iter_periods(start_of_day(since), end):
+        until = _archived_until(_day_dir(root, hostname, day.date()), day)
+        if until < min(day + timedelta(days=1), fetch_until):
+            todo[day] = until
+
+    query = classify.build_query(hostname)
+    results = classify._query_days(awc, query, list(todo), jobs)
+    n = 0
+    for (day, until), day_events in zip(todo.items(), results):
+        stop = min(day + timedelta(days=1), fetch_until)
+        events = classify._clip_events([Event(**e) for e in day_events], until, stop)
+        frame, fingerprint = _classify(EventFrame.from_events(events))
+        meta = {
+            "since": until.isoformat(),
+            "until": stop.isoformat(),
+            "rules_fingerprint": fingerprint,
+        }
+        day_dir = _day_dir(root, hostname, day.date())
+        write_chunk(_next_chunk(day_dir), frame, meta)
+        n += len(frame)
+    logger.info(f"{hostname}: archived {n} new events in {len(todo)} days")
+    return n
+
+
+def compact(hostname: str, root: str = archive_dir) -> int:
+    """
+    Merges the chunks of each day of ``hostname`` into one, sorted by time.
+    Days classified with different rules are reclassified with the loaded
+    rules (or lose their classification, if none are loaded).
+    Returns the number of compacted days.
+    """
+    host_dir = os.path.join(root, hostname)
+    n = 0
+    for name in sorted(os.listdir(host_dir)) if os.path.isdir(host_dir) else []:
+        chunks = _chunks(os.path.join(host_dir, name))
+        if len(chunks) < 2:
+            continue
+        metas = [_read_meta(path) for path in chunks]
+        frame = EventFrame.concat([read_chunk(path) for path in chunks]).sort()
+        fingerprints = {meta["rules_fingerprint"] for meta in metas}
+        fingerprint = fingerprints.pop() if len(fingerprints) == 1 else None
+        if len({*fingerprints, fingerprint}) > 1 or fingerprint is None:
+            frame, fingerprint = _classify(frame.drop(["$category_hierarchy"]))
+        meta = {
+            "since": min(meta["since"] for meta in metas),
+            "until": max(meta["until"] for meta in metas),
+            "rules_fingerprint": fingerprint,
+        }
+        write_chunk(_next_chunk(os.path.join(host_dir, name)), frame, meta)
+        for path in chunks:
+            shutil.rmtree(path)
+        n += 1
+    logger.info(f"{hostname}: compacted {n} days")
+    return n
+
+
+def _build_argparse(parser):
+    parser.add_argument("--root", default=archive_dir)
+    parser.add_argument(
+        "--hostname",
+        action="append",
+        help="Host to archive, can be given several times (default: this host)",
+    )
+    subparsers = parser.add_subparsers(dest="cmd2")
+    import_parser = subparsers.add_parser("import")
+    import_parser.add_argument("--start", type=classify._datetime_arg)
+    import_parser.add_argument("--end", type=classify._datetime_arg)
+    subparsers.add_parser("compact")
+    return parser
+
+
+def _main(args):
+    hostnames = args.hostname or [socket.gethostname()]
+    if args.cmd2 == "import":
+        classify._init_classes("categories.toml", cache=True)
+        end = args.end or datetime.now()
+        start = args.start or end - timedelta(days=7)
+        awc = ActivityWatchClient("aw-research-archive")
+        for hostname in hostnames:
+            import_events(awc, hostname, start, end, args.root)
+    elif args.cmd2 == "compact":
+        classify._init_classes("categories.toml", cache=True)
+        for hostname in hostnames:
+            compact(hostname, args.root)
+    else:
+        print(f"unknown subcommand to archive: {args.cmd2}")
+
+
+if __name__ == "__main__":
+    _parser = argparse.ArgumentParser(description="")
+    _parser = _build_argparse(_parser)
+    _main(_parser.parse_args())
@@ -1,31 +1,56 @@
 import argparse
+import hashlib
+import heapq
+import itertools
 import json
 import logging
+import os
+import pickle
 import re
+import socket
+import threading
 import typing
-from collections import Counter
+import warnings
+from collections import Counter, OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
-from functools import wraps
+from functools import partial, wraps
+from time import perf_counter
 from typing import (
+    Callable,
     Dict,
+    FrozenSet,
+    Iterable,
+    Iterator,
     List,
+    NamedTuple,
     Optional,
+    Pattern,
+    Sequence,
     Set,
     Tuple,
+    Union,
+    overload,
 )
 from urllib.parse import urlparse
 
+try:
+    from re import _parser as sre_parse  # type: ignore
+except ImportError:  # Python <3.11
+    import sre_parse  # type: ignore
+
+import iso8601
 import joblib
-import matplotlib.pyplot as plt
+import numpy as np
 import pandas as pd
 import pydash
-import pytz
 import toml
 from aw_client import ActivityWatchClient
 from aw_core.models import Event
 from aw_transform import filter_period_intersect, flood, union_no_overlap
 
-from .plot_sunburst import sunburst
+from .eventframe import EventFrame
+from .util import get_week_start, iter_periods, start_of_day
 
 logger = logging.getLogger(__name__)
 memory = joblib.Memory("./.cache/joblib")
@@ -73,26 +98,672 @@ def test_read_class_toml():
     assert _read_class_toml("categories.example.toml")
 
 
+def _merge_patterns(patterns: List[str]) -> List[str]:
+    """
+    Merges the patterns of a category into a single alternation.
+
+    Patterns that can't be merged safely (backreferences, conditionals, named
+    groups, global inline flags) are kept as separate patterns, as are all of
+    them if the alternation doesn't parse.
+    """
+    mergeable = [
+        p
+        for p in patterns
+        if not re.search(r"\\\d|\(\?P[=<]|\(\?\(|^\(\?[aiLmsux]+\)", p)
+    ]
+    merged = [p for p in patterns if p not in mergeable]
+    if mergeable:
+        alternation = "|".join(f"(?:{p})" for p in mergeable)
+        try:
+            sre_parse.parse(alternation)
+        except re.error:
+            return patterns
+        merged.insert(0, alternation)
+    return merged
+
+
+def test_merge_patterns():
+    assert _merge_patterns(["GitHub", "GitLab"]) == ["(?:GitHub)|(?:GitLab)"]
+    # Named groups would be redefined in the alternation
+    assert _merge_patterns(["(?P<x>a)", "(?P<x>b)", "c"]) == [
+        "(?:c)",
+        "(?P<x>a)",
+        "(?P<x>b)",
+    ]
+    assert _merge_patterns([r"(a)\1", "b"]) == ["(?:b)", r"(a)\1"]
+    clf = Classifier([("(?P<x>a)", "A", None), ("(?P<x>b)", "A", None)])
+    assert clf.match({"title": "b"}) == {"A"}
+
+
+# Most rules are words or alternations of words, so each rule is prefiltered
+# on the literal substrings that any match of it must contain.
+_MAX_LITERALS = 64
+_MIN_LITERAL_LENGTH = 3
+_REPEATS = {
+    sre_parse.MAX_REPEAT,
+    sre_parse.MIN_REPEAT,
+    getattr(sre_parse, "POSSESSIVE_REPEAT", sre_parse.MAX_REPEAT),
+}
+
+
+def _union_all(sets: List[Optional[Set[str]]]) -> Optional[Set[str]]:
+    """The union of the sets, or None if any of them is None"""
+    if any(s is None for s in sets):
+        return None
+    return set().union(*(s for s in sets if s is not None))
+
+
+def _expand_literals(items) -> Optional[Set[str]]:
+    """Returns all strings matched by a parsed pattern made of literals only"""
+    strings = {""}
+    for op, av in items:
+        chars: Optional[Set[str]] = None
+        if op is sre_parse.LITERAL:
+            chars = {chr(av)}
+        elif op is sre_parse.IN and all(o is sre_parse.LITERAL for o, _ in av):
+            chars = {chr(c) for _, c in av}
+        elif op is sre_parse.SUBPATTERN and not av[1] & re.IGNORECASE:
+            chars = _expand_literals(av[-1])
+        elif op is sre_parse.BRANCH:
+            chars = _union_all([_expand_literals(b) for b in av[1]])
+        if chars is None or len(strings) * len(chars) > _MAX_LITERALS:
+            return None
+        strings = {s + c for s in strings for c in chars}
+    return strings
+
+
+def _required_literals_parsed(items) -> Optional[Set[str]]:
+    candidates = []
+    run = {""}
+    for op, av in items:
+        chars = _expand_literals([(op, av)])
+        if chars is not None:
+            if len(run) * len(chars) > _MAX_LITERALS:
+                candidates.append(run)
+                run = {""}
+            run = {s + c for s in run for c in chars}
+            continue
+        elif op is sre_parse.AT:
+            # Zero-width, literals on both sides are still adjacent
+            continue
+
+        candidates.append(run)
+        run = {""}
+        sub: Optional[Set[str]] = None
+        if op is sre_parse.SUBPATTERN and not av[1] & re.IGNORECASE:
+            sub = _required_literals_parsed(av[-1])
+        elif op is sre_parse.BRANCH:
+            sub = _union_all([_required_literals_parsed(b) for b in av[1]])
+        elif op in _REPEATS and av[0] >= 1:
+            sub = _required_literals_parsed(av[2])
+        if sub:
+            candidates.append(sub)
+    candidates.append(run)
+
+    # Pick the set with the longest shortest literal, the most selective one
+    best = max(candidates, key=lambda c: min(map(len, c)))
+    return best if min(map(len, best)) > 0 else None
+
+
+def _required_literals(pattern: str) -> Optional[Set[str]]:
+    """
+    Returns a set of literals of which every match of ``pattern`` contains at
+    least one, or None if no such set could be extracted.
+    """
+    parsed = sre_parse.parse(pattern)
+    if parsed.state.flags & re.IGNORECASE:
+        return None
+    return _required_literals_parsed(parsed)
+
+
+def test_required_literals():
+    assert _required_literals("[Gg]it[Hh]ub") == {
+        "GitHub",
+        "Github",
+        "gitHub",
+        "github",
+    }
+    assert _required_literals("GitHub|github.com") == {"GitHub", "github"}
+    assert _required_literals(r"GitHub|github\.com") == {"GitHub", "github.com"}
+    assert _required_literals("doc(s|umentation)") == {"docs", "documentation"}
+    assert _required_literals(r"\bvim\b|(?:Neo)?[Vv]im") == {"vim", "Vim"}
+    assert _required_literals(r"Google \w+") == {"Google "}
+    assert _required_literals(r"\d+") is None
+    assert _required_literals("(?i)github") is None
+    # A branch without literals leaves none required
+    assert _required_literals(r"GitHub|\w+") is None
+    assert _required_literals(r"(foo|\w+)bar") == {"bar"}
+
+
+class Category(NamedTuple):
+    """A row in the category closure table built by ``Classifier``"""
+
+    id: int
+    name: str
+    ancestors: FrozenSet[int]
+    depth: int
+    path: str
+    parts: Tuple[str, ...]
+
+
+def _build_category_table(
+    names: List[str], parent_categories: Dict[str, str]
+) -> Dict[str, Category]:
+    """Materializes ids, ancestors, depth and the rendered path of every category"""
+    names = list(dict.fromkeys([*names, *parent_categories.values()]))
+
+    def chain(cat: str) -> List[str]:
+        parts = [cat]
+        while cat in parent_categories and parent_categories[cat] not in parts:
+            cat = parent_categories[cat]
+            parts.append(cat)
+        return parts[::-1]
+
+    ids = {name: i for i, name in enumerate(names)}
+    table = {}
+    for name in names:
+        parts = tuple(chain(name))
+        table[name] = Category(
+            id=ids[name],
+            name=name,
+            ancestors=frozenset(ids[p] for p in parts[:-1]),
+            depth=len(parts) - 1,
+            path=f" {hier_sep} ".join(parts),
+            parts=parts,
+        )
+    return table
+
+
+def _append_app(cat_hier: str, app: Optional[str]) -> str:
+    if app:
+        app = app.lstrip("www.").rstrip(".com")
+        if app.lower() not in cat_hier.lower():
+            cat_hier = f"{cat_hier} {hier_sep} {app}"
+    return cat_hier
+
+
+class CacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    maxsize: int
+    currsize: int
+
+
+class _LRUCache:
+    """A bounded, thread-safe LRU mapping whose entries can be listed"""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple) -> Optional[tuple]:
+        with self._lock:
+            value = self._data.get(key)
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._data.move_to_end(key)
+            return value
+
+    def put(self, key: tuple, value: tuple) -> None:
+        with self._lock:
+            self._data[key] = value
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def items(self) -> List[Tuple[tuple, tuple]]:
+        with self._lock:
+            return list(self._data.items())
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def info(self) -> CacheInfo:
+        return CacheInfo(self.hits, self.misses, self.maxsize, len(self._data))
+
+
+class Classifier:
+    """
+    A set of category rules, compiled once.
+
+    All patterns for a category are merged into one alternation so that each
+    event field is scanned once per category instead of once per rule.
+    Ancestors, depth and hierarchy path of every category are precomputed in
+    ``categories``, so classification only needs lookups.
+    """
+
+    fields = ("title", "app", "url")
+    # Bumped when the pickled attributes change, part of the on-disk cache key
+    pickle_version = 1
+
+    def __init__(
+        self, rules: List[Tuple[str, str, Optional[str]]], cache_size: int = 2**16
+    ):
+        self.rules = rules
+        self.parent_categories = {tag: parent for _, tag, parent in rules if parent}
+        self.fingerprint = hashlib.sha256(json.dumps(rules).encode()).hexdigest()
+
+        patterns: Dict[str, List[str]] = {}
+        for re_pattern, cat, _ in rules:
+            try:
+                re.compile(re_pattern)
+            except re.error:
+                logger.warning(f"Failed to compile regex for {cat}: {re_pattern}")
+                continue
+            patterns.setdefault(cat, []).append(re_pattern)
+        self.category_patterns = patterns
+
+        self.categories = _build_category_table(
+            [cat for _, cat, _ in rules], self.parent_categories
+        )
+        self._by_id = sorted(self.categories.values(), key=lambda c: c.id)
+        # Patterns are compiled lazily (see ``pattern``), many are never needed
+        # thanks to the literal prefilter below.
+        self.patterns: List[Tuple[int, str]] = [
+            (self.categories[cat].id, r)
+            for cat, pats in patterns.items()
+            for r in _merge_patterns(pats)
+        ]
+
+        # Patterns are only searched if one of their required literals occurs
+        # in a value. Literals are looked up through the trigrams of the value.
+        self._unfiltered: List[int] = []
+        self._trigrams: Dict[str, List[Tuple[str, int]]] = {}
+        for i, (_, pattern) in enumerate(self.patterns):
+            literals = _required_literals(pattern)
+            if not literals or min(map(len, literals)) < _MIN_LITERAL_LENGTH:
+                self._unfiltered.append(i)
+                continue
+            for literal in literals:
+                self._trigrams.setdefault(literal[:3], []).append((literal, i))
+        self._trigram_keys = frozenset(self._trigrams)
+
+        self._cache_size = cache_size
+        self._init_caches()
+
+    def _init_caches(self) -> None:
+        self._compiled: List[Optional[Pattern]] = [None] * len(self.patterns)
+        # Window data repeats the same (app, title, url) a lot, so results are
+        # cached per distinct triple. A new Classifier (new rules) starts empty,
+        # or with the entries of the previous one that are still valid, see
+        # ``inherit_cache``.
+        self._cache = _LRUCache(self._cache_size)
+
+    def __getstate__(self) -> dict:
+        # Compiled patterns are recompiled on load anyway, and caches don't pickle
+        state = self.__dict__.copy()
+        del state["_compiled"]
+        del state["_cache"]
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._init_caches()
+
+    def pattern(self, i: int) -> Pattern:
+        """Returns the compiled pattern ``i`` of ``patterns``"""
+        r = self._compiled[i]
+        if r is None:
+            cat, pattern = self.patterns[i]
+            try:
+                r = re.compile(pattern)
+            except re.error as e:
+                # Rules are checked one by one on load, so this is a bad merge
+                logger.error(
+                    f"Failed to compile regex for {self._by_id[cat].name}, "
+                    f"skipping it: {pattern} ({e})"
+                )
+                r = re.compile("(?!)")
+            self._compiled[i] = r
+        return r
+
+    def match(self, data: dict) -> Set[str]:
+        """Returns the set of tags (including parents) for the fields in ``data``"""
+        ids = self._match([data[attr] for attr in self.fields if attr in data])
+        return {self._by_id[i].name for i in ids}
+
+    def _candidates(self, values: List[str]) -> List[int]:
+        """Returns the indices of the patterns that may match one of ``values``"""
+        found = set(self._unfiltered)
+        for v in values:
+            grams = {v[i : i + 3] for i in range(len(v) - 2)}
+            for gram in grams & self._trigram_keys:
+                for literal, i in self._trigrams[gram]:
+                    if literal in v:
+                        found.add(i)
+        return sorted(found)
+
+    def _match(self, values: List[str]) -> Set[int]:
+        tags: Set[int] = set()
+        for i in self._candidates(values):
+            cat = self.patterns[i][0]
+            if cat in tags:
+                continue
+            r = self._compiled[i] or self.pattern(i)
+            for v in values:
+                if r.search(v):
+                    tags.add(cat)
+                    tags |= self._by_id[cat].ancestors
+                    break
+        return tags
+
+    def classify(
+        self, data: dict, include_app=False, max_category_depth=3
+    ) -> Tuple[FrozenSet[str], str]:
+        """
+        Returns the tags and category hierarchy for the fields in ``data``.
+
+        Results are memoized per distinct (app, title, url), see ``cache_info``.
+        """
+        return self._lookup(
+            (
+                data.get("app"),
+                data.get("title"),
+                data.get("url"),
+                include_app,
+                max_category_depth,
+            )
+        )
+
+    def _lookup(self, key: tuple) -> Tuple[FrozenSet[str], str]:
+        result = self._cache.get(key)
+        if result is None:
+            result = self._classify(*key)
+            self._cache.put(key, result)
+        return result
+
+    def _classify(
+        self,
+        app: Optional[str],
+        title: Optional[str],
+        url: Optional[str],
+        include_app: bool,
+        max_category_depth: int,
+    ) -> Tuple[FrozenSet[str], str]:
+        tags = [
+            self._by_id[i]
+            for i in sorted(
+                self._match([v for v in (title, app, url) if v is not None])
+            )
+        ]
+        if not tags:
+            return frozenset({"Uncategorized"}), "Uncategorized"
+
+        return frozenset(c.name for c in tags), self._hierarchy(
+            tags, app if include_app else None, max_category_depth
+        )
+
+    def _hierarchy(
+        self, tags: List[Category], app: Optional[str], max_category_depth: int
+    ) -> str:
+        # Always assign the deepest category, on ties the first one defined.
+        # A top-level category never replaces "Uncategorized".
+        if app:
+            # The app is only appended if not already part of the hierarchy,
+            # so depths have to be compared on the rendered strings.
+            cat_hier = "Uncategorized"
+            for c in tags:
+                new_cat_hier = _append_app(c.path, app)
+                if new_cat_hier.count(hier_sep) > cat_hier.count(hier_sep):
+                    cat_hier = new_cat_hier
+            return _restrict_category_depth(cat_hier, max_category_depth)
+
+        deepest = max(tags, key=lambda c: c.depth)
+        if deepest.depth == 0:
+            return "Uncategorized"
+        elif deepest.depth < max_category_depth:
+            return deepest.path
+        else:
+            # Restrict maximum category depth
+            return f" {hier_sep} ".join(deepest.parts[:max_category_depth])
+
+    def cache_info(self) -> CacheInfo:
+        """Hit/miss counters of the classification cache"""
+        return self._cache.info()
+
+    def cache_clear(self) -> None:
+        self._cache.clear()
+
+    def inherit_cache(self, old: "Classifier") -> int:
+        """
+        Copies the cached results of ``old`` that are unaffected by the
+        differences in rules, and returns how many were kept.
+
+        A result is dropped if it is tagged with a category whose patterns or
+        ancestors changed, or if a changed pattern matches its fields.
+        Hierarchies of kept results are rebuilt from the new category table.
+        """
+        names = self.category_patterns.keys() | old.category_patterns.keys()
+        changed = {
+            cat
+            for cat in names
+            if self.category_patterns.get(cat) != old.category_patterns.get(cat)
+        }
+        dirty = changed | {
+            cat
+            for cat in self.categories.keys() | old.categories.keys()
+            if cat not in self.categories
+            or cat not in old.categories
+            or self.categories[cat].path != old.categories[cat].path
+        }
+        changed_patterns = [
+            i
+            for i, (cat, _) in enumerate(self.patterns)
+            if self._by_id[cat].name in changed
+        ]
+
+        kept = 0
+        for key, (tags, _) in old._cache.items():
+            if tags & dirty:
+                continue
+            app, title, url, include_app, max_category_depth = key
+            values = [v for v in (title, app, url) if v is not None]
+            if any(self.pattern(i).search(v) for i in changed_patterns for v in values):
+                continue
+            rows = sorted(
+                (self.categories[cat] for cat in tags if cat in self.categories),
+                key=lambda c: c.id,
+            )
+            cat_hier = (
+                self._hierarchy(rows, app if include_app else None, max_category_depth)
+                if rows
+                else "Uncategorized"
+            )
+            self._cache.put(key, (tags, cat_hier))
+            kept += 1
+        return kept
+
+
+def test_classifier():
+    clf = Classifier(_read_class_toml("categories.example.toml"))
+    assert clf.match({"title": "GitHub - ActivityWatch", "app": "Firefox"}) == {
+        "Programming",
+        "Work",
+    }
+    assert clf.match({"title": "Spotify", "app": "spotify"}) == {"Music", "Media"}
+    assert clf.match({"title": "Nothing here"}) == set()
+    assert clf.match({"title": "Stack Overflow"}) == {"Programming", "Work"}
+    assert clf._candidates(["Nothing here"]) == []
+
+    programming = clf.categories["Programming"]
+    assert programming.depth == 1
+    assert programming.path == "Work -> Programming"
+    assert programming.ancestors == {clf.categories["Work"].id}
+
+
 classes: Optional[List[Tuple[str, str, Optional[str]]]] = None
 parent_categories: Optional[Dict[str, str]] = None
+classifier: Optional[Classifier] = None
+
+
+def _read_class_file(filename: str) -> List[Tuple[str, str, Optional[str]]]:
+    if filename.endswith("csv"):
+        return _read_class_csv(filename)
+    else:
+        return _read_class_toml(filename)
+
+
+@memory.cache
+def _load_classifier(
+    filename: str, mtime: float, digest: str, version: int
+) -> Classifier:
+    """
+    Builds the Classifier for a rules file, cached by its path, mtime and content,
+    and the ``Classifier.pickle_version`` it was cached with.
+    """
+    return Classifier(_read_class_file(filename))
 
 
 def _init_classes(
-    filename: str = None, new_classes: List[Tuple[str, str, Optional[str]]] = None
+    filename: str = None,
+    new_classes: List[Tuple[str, str, Optional[str]]] = None,
+    cache: bool = False,
 ):
-    global classes, parent_categories
-
-    if filename and filename.endswith("csv"):
-        classes = _read_class_csv(filename)
-    elif filename and filename.endswith("toml"):
-        classes = _read_class_toml(filename)
+    """
+    Loads the category rules from a .csv/.toml file or from ``new_classes``.
+
+    With ``cache``, the parsed and prepared rules of a file are stored on disk
+    and loaded directly on the next start, as long as the file is unchanged.
+    """
+    if filename and filename.endswith(("csv", "toml")):
+        if cache:
+            with open(filename, "rb") as f:
+                digest = hashlib.sha256(f.read()).hexdigest()
+            new_classifier = _load_classifier(
+                os.path.abspath(filename),
+                os.path.getmtime(filename),
+                digest,
+                Classifier.pickle_version,
+            )
+        else:
+            new_classifier = Classifier(_read_class_file(filename))
     elif new_classes:
-        classes = new_classes
+        new_classifier = Classifier(new_classes)
     else:
         raise Exception
 
-    assert classes
-    parent_categories = {tag: parent for _, tag, parent in classes if parent}
+    assert new_classifier.rules
+    _set_classifier(new_classifier)
+
+
+def _set_classifier(new_classifier: Classifier) -> None:
+    # Functions using the rules read ``classifier`` once and keep using that
+    # snapshot, so replacing it is atomic for them.
+    global classes, parent_categories, classifier
+    classes = new_classifier.rules
+    parent_categories = new_classifier.parent_categories
+    classifier = new_classifier
+
+
+class RulesWatcher:
+    """
+    Reloads the category rules when the rules file changes, for long-running
+    processes.
+
+    Polls the mtime of the file in a background thread. The new rules are built
+    in that thread and swapped in atomically, carrying over the cached results
+    that are unaffected by the changes (see ``Classifier.inherit_cache``).
+    Calls that already started keep using the rules they started with.
+    """
+
+    def __init__(self, filename: str, interval: float = 5.0):
+        self.filename = filename
+        self.interval = interval
+        self._mtime: Optional[float] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def check(self) -> bool:
+        """Reloads the rules if the file changed since the last check"""
+        mtime = os.path.getmtime(self.filename)
+        if mtime == self._mtime:
+            return False
+        new_classifier = Classifier(_read_class_file(self.filename))
+        old_classifier = classifier
+        if old_classifier is not None and self._mtime is not None:
+            kept = new_classifier.inherit_cache(old_classifier)
+            logger.info(
+                f"Reloaded rules from {self.filename}, "
+                f"kept {kept}/{old_classifier.cache_info().currsize} cached results"
+            )
+        _set_classifier(new_classifier)
+        self._mtime = mtime
+        return True
+
+    def start(self) -> "RulesWatcher":
+        self.check()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.check()
+            except Exception:
+                logger.exception(f"Failed to reload rules from {self.filename}")
+
+
+def test_rules_watcher(tmp_path):
+    filename = tmp_path / "categories.toml"
+    filename.write_text("""
+        [categories.Work]
+        Programming = "GitHub"
+        Writing = "Docs"
+        """)
+    watcher = RulesWatcher(str(filename))
+    assert watcher.check()
+    assert classifier
+    data = [{"title": "GitHub"}, {"title": "Docs"}, {"title": "Google Docs"}]
+    for d in data:
+        classifier.classify(d)
+
+    # Edit the Writing rule
+    filename.write_text("""
+        [categories.Work]
+        Programming = "GitHub"
+        Writing = "Google Docs"
+        """)
+    os.utime(filename, (0, 0))
+    old_classifier = classifier
+    assert watcher.check()
+    assert classifier is not old_classifier
+    assert not watcher.check()
+
+    # Only the result of the unaffected event is kept
+    assert classifier.cache_info().currsize == 1
+    assert classifier.classify(data[0])[1] == "Work -> Programming"
+    assert classifier.classify(data[1])[1] == "Uncategorized"
+    assert classifier.classify(data[2])[1] == "Work -> Writing"
+    assert classifier.cache_info().hits == 1
+
+
+def test_pickle_classifier():
+    clf = Classifier(_read_class_toml("categories.example.toml"))
+    clf.match({"title": "GitHub"})
+    loaded = pickle.loads(pickle.dumps(clf))
+    assert loaded.fingerprint == clf.fingerprint
+    assert loaded.match({"title": "GitHub"}) == {"Programming", "Work"}
+    assert loaded.cache_info().currsize == 0
+
+
+def test_pattern_compile_error(caplog):
+    clf = Classifier([("GitHub", "Programming", None)])
+    clf.patterns[0] = (clf.patterns[0][0], "(GitHub")
+    assert clf.match({"title": "GitHub"}) == set()
+    assert "Failed to compile regex for Programming" in caplog.text
 
 
 def requires_init_classes(f):
@@ -107,14 +778,11 @@ def requires_init_classes(f):
 
 @requires_init_classes
 def get_parent_categories(cat: str) -> Set[str]:
-    assert parent_categories  # just to quiet typechecker, checked by decorator
-
-    # Recursive
-    if cat in parent_categories:
-        cats = {parent_categories[cat]}
-        for parent in tuple(cats):
-            cats |= get_parent_categories(parent)
-        return cats
+    clf = classifier
+    assert clf  # just to quiet typechecker, checked by decorator
+
+    if cat in clf.categories:
+        return set(clf.categories[cat].parts[:-1])
     return set()
 
 
@@ -123,68 +791,319 @@ hier_sep = "->"
 
 @requires_init_classes
 def build_category_hierarchy(cat: str, app: str = None) -> str:
-    assert parent_categories  # just to quiet typechecker, checked by decorator
-
-    # Recursive
-    s = cat
-    if cat in parent_categories:
-        parent = parent_categories[cat]
-        parents_of_parent = build_category_hierarchy(parent)
-        if parents_of_parent:
-            s = f"{parents_of_parent} {hier_sep} {s}"
-    if app:
-        app = app.lstrip("www.").rstrip(".com")
-        if app.lower() not in s.lower():
-            s = f"{s} {hier_sep} {app}"
-    return s
+    clf = classifier
+    assert clf  # just to quiet typechecker, checked by decorator
 
+    s = clf.categories[cat].path if cat in clf.categories else cat
+    return _append_app(s, app)
 
-@requires_init_classes
+
+@overload
 def classify(
-    events: List[Event], include_app=False, max_category_depth=3
-) -> List[Event]:
-    assert classes  # just to quiet typechecker, checked by decorator
+    events: List[Event], include_app=..., max_category_depth=...
+) -> List[Event]: ...
+
+
+@overload
+def classify(
+    events: EventFrame, include_app=..., max_category_depth=...
+) -> EventFrame: ...
+
+
+@overload
+def classify(
+    events: pd.DataFrame, include_app=..., max_category_depth=...
+) -> pd.DataFrame: ...
+
+
+@requires_init_classes
+def classify(events, include_app=False, max_category_depth=3):
+    """
+    Classifies events, adding the ``$tags`` and ``$category_hierarchy`` fields.
+
+    Takes either a list of events, which are modified in place, a DataFrame
+    with the event data as columns (see ``classify_dataframe``) or an
+    ``EventFrame`` (see ``classify_eventframe``).
+    """
+    if isinstance(events, pd.DataFrame):
+        return classify_dataframe(events, include_app, max_category_depth)
+    elif isinstance(events, EventFrame):
+        return classify_eventframe(events, include_app, max_category_depth)
+
+    clf = classifier
+    assert clf  # just to quiet typechecker, checked by decorator
 
     for e in events:
-        e.data["$tags"] = set()
-        e.data["$category_hierarchy"] = "Uncategorized"
+        tags, cat_hier = clf.classify(e.data, include_app, max_category_depth)
+        e.data["$tags"] = set(tags)
+        e.data["$category_hierarchy"] = cat_hier
 
-    for re_pattern, cat, _ in classes:
-        try:
-            r = re.compile(re_pattern)
-        except Exception:
-            logger.warning(f"Failed to compile regex for {cat}: {re_pattern}")
+    return events
+
+
+@requires_init_classes
+def classify_dataframe(
+    df: pd.DataFrame, include_app=False, max_category_depth=3
+) -> pd.DataFrame:
+    """
+    Columnar version of ``classify`` for a DataFrame with one row per event.
+
+    Each rule is applied with ``Series.str.contains`` to the unique values of
+    the title, app and url columns, and the results are spread out to the rows
+    of every distinct (title, app, url). Returns a copy of ``df`` with added
+    ``$tags`` (frozensets) and ``$category_hierarchy`` columns.
+    """
+    clf = classifier
+    assert clf  # just to quiet typechecker, checked by decorator
+
+    fields = [attr for attr in Classifier.fields if attr in df.columns]
+    factorized = [pd.factorize(df[attr]) for attr in fields]
+    results, inverse = _classify_encoded(
+        clf,
+        fields,
+        [codes for codes, _ in factorized],
+        [values for _, values in factorized],
+        len(df),
+        include_app,
+        max_category_depth,
+    )
+
+    df = df.copy()
+    tags_column = np.empty(len(results), dtype=object)
+    tags_column[:] = [tags for tags, _ in results]
+    df["$tags"] = tags_column[inverse]
+    df["$category_hierarchy"] = pd.Categorical.from_codes(
+        *pd.factorize(np.array([cat_hier for _, cat_hier in results], dtype=object))
+    )[inverse]
+    return df
+
+
+@requires_init_classes
+def classify_eventframe(
+    frame: EventFrame, include_app=False, max_category_depth=3
+) -> EventFrame:
+    """
+    Version of ``classify`` for an ``EventFrame``, working on its dictionary
+    encoded columns directly. Returns a frame with an added (also dictionary
+    encoded) ``$category_hierarchy`` column.
+    """
+    clf = classifier
+    assert clf  # just to quiet typechecker, checked by decorator
+
+    fields = [attr for attr in Classifier.fields if attr in frame.columns]
+    results, inverse = _classify_encoded(
+        clf,
+        fields,
+        [frame.columns[attr][0] for attr in fields],
+        [frame.columns[attr][1] for attr in fields],
+        len(frame),
+        include_app,
+        max_category_depth,
+    )
+    codes, values = pd.factorize(
+        np.array([cat_hier for _, cat_hier in results], dtype=object)
+    )
+    return frame.with_column("$category_hierarchy", codes[inverse], values)
+
+
+def _classify_encoded(
+    clf: Classifier,
+    fields: List[str],
+    codes: List[np.ndarray],
+    values: List[np.ndarray],
+    n: int,
+    include_app: bool,
+    max_category_depth: int,
+) -> Tuple[List[Tuple[FrozenSet[str], str]], np.ndarray]:
+    """
+    Classifies every distinct combination of the dictionary encoded ``fields``
+    (codes of -1 are missing values). Returns the tags and hierarchy of each
+    combination, and the index of the combination of each of the ``n`` rows.
+    """
+    uniques = [pd.Series(v, dtype=object) for v in values]
+    if fields:
+        distinct, inverse = np.unique(
+            np.column_stack(codes), axis=0, return_inverse=True
+        )
+        inverse = inverse.reshape(-1)
+    else:
+        distinct, inverse = np.zeros((1, 0), dtype=int), np.zeros(n, dtype=int)
+
+    tagged = np.zeros((len(distinct), len(clf.categories)), dtype=bool)
+    for i, (cat, _) in enumerate(clf.patterns):
+        r = clf.pattern(i)
+        matched = np.zeros(len(distinct), dtype=bool)
+        for j, unique_values in enumerate(uniques):
+            with warnings.catch_warnings():
+                # Warns about match groups, which are only used for alternation
+                warnings.simplefilter("ignore", UserWarning)
+                mask = unique_values.str.contains(r).to_numpy(bool)
+            # The trailing False is picked by missing values (code -1)
+            matched |= np.append(mask, False)[distinct[:, j]]
+        tagged[matched, cat] = True
+        for ancestor in clf._by_id[cat].ancestors:
+            tagged[matched, ancestor] = True
+
+    app_i = fields.index("app") if include_app and "app" in fields else None
+    results = []
+    for row, ids in zip(distinct, tagged):
+        tags = [clf._by_id[i] for i in np.flatnonzero(ids)]
+        if not tags:
+            results.append((frozenset({"Uncategorized"}), "Uncategorized"))
             continue
+        app = (
+            uniques[app_i][row[app_i]]
+            if app_i is not None and row[app_i] >= 0
+            else None
+        )
+        results.append(
+            (
+                frozenset(c.name for c in tags),
+                clf._hierarchy(tags, app, max_category_depth),
+            )
+        )
+    return results, inverse
 
-        for e in events:
-            for attr in ["title", "app", "url"]:
-                if attr not in e.data:
-                    continue
-                if cat not in e.data["$tags"] and r.findall(e.data[attr]):
-                    e.data["$tags"].add(cat)
-                    e.data["$tags"] |= get_parent_categories(cat)
 
-    for e in events:
-        app = e.data.get("app", None) if include_app else None
-        for cat in e.data["$tags"]:
-            # Always assign the deepest category
-            new_cat_hier = build_category_hierarchy(cat, app=app)
-            if "$category_hierarchy" in e.data:
-                old_cat_hier = e.data["$category_hierarchy"]
-                if old_cat_hier.count(hier_sep) >= new_cat_hier.count(hier_sep):
-                    continue
-            e.data["$category_hierarchy"] = new_cat_hier
+def test_classify_dataframe():
+    _init_classes("categories.example.toml")
+    data = [
+        {"app": "Firefox", "title": "GitHub"},
+        {"app": "Firefox", "title": "Spotify"},
+        {"app": "Firefox", "title": "GitHub"},
+        {"app": "Alacritty", "title": "vim"},
+        {"app": "Firefox", "title": "YouTube", "url": "https://youtube.com/"},
+    ]
+    df = classify(pd.DataFrame(data))
+    events = classify([Event(data=d) for d in data])
+    assert list(df["$category_hierarchy"]) == [
+        e.data["$category_hierarchy"] for e in events
+    ]
+    assert list(df["$tags"]) == [e.data["$tags"] for e in events]
+
+    df = classify(pd.DataFrame(data), include_app=True)
+    events = classify([Event(data=d) for d in data], include_app=True)
+    assert list(df["$category_hierarchy"]) == [
+        e.data["$category_hierarchy"] for e in events
+    ]
+
+
+def test_classify_eventframe(make_events):
+    import pytest
+
+    _init_classes(
+        new_classes=[
+            ("GitHub", "Programming", "Work"),
+            ("YouTube", "Video", "Media"),
+            ("Firefox", "Browser", None),
+        ]
+    )
+    titles = ["GitHub", "YouTube", "Nothing", "GitHub - Firefox"]
+    data = {"app": ["Firefox", "Code"], "title": titles}
+    events = make_events(100, timedelta(minutes=1), timedelta(seconds=30), data)
+    frame = classify(EventFrame.from_events(events), include_app=True)
+    classify(events, include_app=True)
+    assert frame.column("$category_hierarchy").tolist() == [
+        e.data["$category_hierarchy"] for e in events
+    ]
+    assert time_per_category(frame) == pytest.approx(time_per_category(events))
+    assert time_per_app(frame) == pytest.approx(time_per_app(events))
+
+
+def test_classify_cache():
+    _init_classes("categories.example.toml")
+    assert classifier
+    events = [
+        Event(data={"app": "Firefox", "title": "GitHub"}),
+        Event(data={"app": "Firefox", "title": "GitHub"}),
+        Event(data={"app": "Firefox", "title": "Something else"}),
+    ]
+    events = classify(events)
+    assert events[0].data["$category_hierarchy"] == "Work -> Programming"
+    assert events[2].data["$tags"] == {"Uncategorized"}
+    info = classifier.cache_info()
+    assert (info.hits, info.misses) == (1, 2)
+
+    # Tags are copied out of the cache, so mutating them is safe
+    events[0].data["$tags"].add("Test")
+    assert "Test" not in events[1].data["$tags"]
+
+    # Reloading the rules starts with an empty cache
+    _init_classes("categories.example.toml")
+    assert classifier.cache_info().currsize == 0
+
+
+def _init_worker(rules: List[Tuple[str, str, Optional[str]]]) -> None:
+    # Compile the rules once per worker process
+    _init_classes(new_classes=rules)
+
+
+def _classify_chunk(
+    fields: List[Tuple[Optional[str], Optional[str], Optional[str]]],
+    durations: List[float],
+    include_app: bool,
+    max_category_depth: int,
+) -> Tuple[List[Tuple[FrozenSet[str], str]], Dict[str, float]]:
+    assert classifier
+    results = [
+        classifier._lookup((app, title, url, include_app, max_category_depth))
+        for app, title, url in fields
+    ]
+    time_per_hier: Dict[str, float] = {}
+    for (_, cat_hier), seconds in zip(results, durations):
+        time_per_hier[cat_hier] = time_per_hier.get(cat_hier, 0) + seconds
+    return results, time_per_hier
+
 
-        # Restrict maximum category depth
-        e.data["$category_hierarchy"] = _restrict_category_depth(
-            e.data["$category_hierarchy"], max_category_depth
+@requires_init_classes
+def classify_parallel(
+    events: List[Event], jobs: int, include_app=False, max_category_depth=3
+) -> Tuple[List[Event], typing.Counter[str]]:
+    """
+    Classifies events in a pool of ``jobs`` processes, with one chunk per day.
+
+    Only the (app, title, url) fields are sent to the workers, and results are
+    written back to the events like ``classify`` does. Returns the events in
+    timestamp order, and their time per category merged from the per-chunk
+    counters.
+    """
+    assert classifier  # just to quiet typechecker, checked by decorator
+
+    events = sorted(events, key=lambda e: e.timestamp)
+    chunks = [
+        list(chunk)
+        for _, chunk in itertools.groupby(events, key=lambda e: e.timestamp.date())
+    ]
+
+    time_per_hier: typing.Counter[str] = Counter()
+    with ProcessPoolExecutor(
+        max_workers=jobs, initializer=_init_worker, initargs=(classifier.rules,)
+    ) as executor:
+        results = executor.map(
+            _classify_chunk,
+            [
+                [(e.data.get("app"), e.data.get("title"), e.data.get("url")) for e in c]
+                for c in chunks
+            ],
+            [[e.duration.total_seconds() for e in c] for c in chunks],
+            itertools.repeat(include_app),
+            itertools.repeat(max_category_depth),
         )
+        for chunk, (chunk_results, chunk_time_per_hier) in zip(chunks, results):
+            for e, (tags, cat_hier) in zip(chunk, chunk_results):
+                e.data["$tags"] = set(tags)
+                e.data["$category_hierarchy"] = cat_hier
+            time_per_hier.update(chunk_time_per_hier)
+    return events, _unfold_time_per_category(time_per_hier)
 
-    for e in events:
-        if not e.data["$tags"]:
-            e.data["$tags"].add("Uncategorized")
 
-    return events
+def test_classify_parallel(make_events):
+    _init_classes("categories.example.toml")
+    data = {"app": ["Firefox"], "title": ["GitHub", "YouTube", "Nothing"]}
+    events = make_events(20, timedelta(hours=5), timedelta(hours=1), data)[::-1]
+    classified, time_per = classify_parallel(events, jobs=2)
+    assert [e.timestamp for e in classified] == sorted(e.timestamp for e in events)
+    assert time_per == time_per_category(classify(events))
 
 
 def _hostname(url: str) -> str:
@@ -203,20 +1122,84 @@ def unfold_hier(s: str) -> List[str]:
     return cats_s
 
 
-def time_per_category(events: List[Event], unfold=True) -> typing.Counter[str]:
-    c: typing.Counter[str] = Counter()
-    for e in events:
-        if unfold:
-            cats = unfold_hier(e.data["$category_hierarchy"])
-        else:
-            cats = [e.data["$category_hierarchy"]]
-        for cat in cats:
-            # FIXME: This will be wrong when subcategories with the same name exist with different parents
-            c[cat] += e.duration.total_seconds()
-    return c
+def time_per_category(
+    events: Union[List[Event], EventFrame], unfold=True
+) -> typing.Counter[str]:
+    # Sum the time of each distinct hierarchy once, before unfolding
+    if isinstance(events, EventFrame):
+        time_per_hier = _time_per_value(events, "$category_hierarchy")
+    else:
+        seconds: Dict[str, float] = {}
+        for e in events:
+            cat_hier = e.data["$category_hierarchy"]
+            seconds[cat_hier] = seconds.get(cat_hier, 0) + e.duration.total_seconds()
+        time_per_hier = Counter(seconds)
+    return _unfold_time_per_category(time_per_hier) if unfold else time_per_hier
+
+
+def _unfold_time_per_category(
+    time_per_hier: typing.Counter[str],
+) -> typing.Counter[str]:
+    # Key categories by their path of interned ids, so that subcategories with
+    # the same name under different parents are kept apart.
+    names: Dict[str, int] = {}
+    time_per_path: Dict[Tuple[int, ...], float] = {}
+    for cat_hier, seconds in time_per_hier.items():
+        path = tuple(
+            names.setdefault(cat, len(names)) for cat in cat_hier.split(" -> ")
+        )
+        time_per_path[path] = time_per_path.get(path, 0) + seconds
+        for i in range(1, len(path)):
+            time_per_path.setdefault(path[:i], 0)
+
+    # Roll up sums to the parents, children before parents
+    for path in sorted(time_per_path, key=len, reverse=True):
+        if len(path) > 1:
+            time_per_path[path[:-1]] += time_per_path[path]
+
+    cat_names = list(names)
+    return Counter(
+        {
+            " -> ".join(cat_names[i] for i in path): seconds
+            for path, seconds in time_per_path.items()
+        }
+    )
+
+
+def test_time_per_category():
+    def event(cat_hier: str, minutes: int) -> Event:
+        return Event(
+            timestamp=datetime(2020, 1, 1, tzinfo=timezone.utc),
+            duration=timedelta(minutes=minutes),
+            data={"$category_hierarchy": cat_hier},
+        )
+
+    events = [
+        event("Work -> Programming -> Python", 10),
+        event("Work -> Programming", 5),
+        event("Work -> Programming -> Python", 10),
+        event("Media -> Programming", 15),
+        event("Uncategorized", 1),
+    ]
+    c = time_per_category(events)
+    assert c["Work"] == 25 * 60
+    assert c["Work -> Programming"] == 25 * 60
+    assert c["Work -> Programming -> Python"] == 20 * 60
+    assert c["Media"] == c["Media -> Programming"] == 15 * 60
+    assert c["Uncategorized"] == 60
+    assert "Programming" not in c
+
+    c = time_per_category(events, unfold=False)
+    assert c["Work -> Programming -> Python"] == 20 * 60
+    assert "Work" not in c
 
 
 def _plot_category_hierarchy_sunburst(events):
+    # Imported here since matplotlib is slow to import, and only needed for plots
+    import matplotlib.pyplot as plt
+
+    from .plot_sunburst import sunburst
+
     counter = time_per_category(events, unfold=False)
     data = {}
     for cat in counter:
@@ -247,7 +1230,18 @@ def _restrict_category_depth(s: str, n: int) -> str:
     return " -> ".join(s.split(" -> ")[:n])
 
 
+def _time_per_value(frame: EventFrame, column: str) -> typing.Counter[str]:
+    codes, values = frame.columns[column]
+    present = codes >= 0
+    seconds = np.bincount(
+        codes[present], weights=frame.duration[present], minlength=len(values)
+    )
+    return Counter(dict(zip(values.tolist(), (seconds / 1_000_000).tolist())))
+
+
 def time_per_app(events):
+    if isinstance(events, EventFrame):
+        return _time_per_value(events, "app")
     c = Counter()
     for e in events:
         if "app" in e.data:
@@ -332,32 +1326,223 @@ def _query_complete():  # noqa
 # fmt: on
 
 
-def _get_events_toggl(since: datetime, filepath: str) -> List[Event]:
-    with open(filepath, "r", encoding="utf-8-sig") as f:
-        lines = f.readlines()
-        rows = [l.strip().split(",") for l in lines]
-        header = rows[0]
-        rows = rows[1:]
-        entries: List[Dict] = [{"data": dict(zip(header, row))} for row in rows]
-        for e in entries:
-            for s in ["Start", "End"]:
-                yyyy, mm, dd = map(int, e["data"].pop(f"{s} date").split("-"))
-                HH, MM, SS = map(int, e["data"].pop(f"{s} time").split(":"))
-                e["data"][s] = datetime(yyyy, mm, dd, HH, MM, SS).astimezone(
-                    pytz.timezone("Europe/Stockholm")
-                )
-            e["timestamp"] = e["data"].pop("Start")
-            e["duration"] = e["data"].pop("End") - e["timestamp"]
-            del e["data"]["User"]
-            del e["data"]["Email"]
-            del e["data"]["Duration"]
+# Aggregations appended to the complete query for the pushdown reports
+# fmt: off
+# The arguments are variables set earlier in the query
+@query2ify
+def _query_merge_by_category(events, classes):  # noqa
+    from aw_transform import (categorize, merge_events_by_keys)
+    events = categorize(events, classes)
+    events = merge_events_by_keys(events, ["$category"])
+    return events
 
-            e["data"]["app"] = e["data"]["Project"]
-            e["data"]["title"] = e["data"]["Description"]
 
-    events = [Event(**e) for e in entries]
-    events = [e for e in events if since.astimezone(timezone.utc) < e.timestamp]
+@query2ify
+def _query_merge_by_app(events):  # noqa
+    from aw_transform import merge_events_by_keys
+    events = merge_events_by_keys(events, ["app"])
     return events
+# fmt: on
+
+
+def _query2_literal(value) -> str:
+    """Renders a list/dict/str value as a query2 literal"""
+    if isinstance(value, str):
+        # query2 only unescapes the quote character, backslashes are kept as-is
+        return '"' + value.replace('"', '\\"') + '"'
+    elif isinstance(value, dict):
+        items = (
+            f"{_query2_literal(k)}: {_query2_literal(v)}" for k, v in value.items()
+        )
+        return "{" + ", ".join(items) + "}"
+    elif isinstance(value, (list, tuple)):
+        return "[" + ", ".join(map(_query2_literal, value)) + "]"
+    else:
+        raise TypeError(f"Unsupported type in query2 literal: {type(value)}")
+
+
+def _query2_classes(clf: Classifier) -> list:
+    """
+    Converts the rules to the classes argument of the query2 ``categorize`` function.
+
+    The server assigns the deepest matching category like ``Classifier`` does, but
+    keeps the last match on ties, so the rules are passed in reverse. Top-level
+    categories are left out, since they never replace "Uncategorized".
+    """
+    classes = []
+    for cat_id, pattern in clf.patterns:
+        cat = clf._by_id[cat_id]
+        if cat.depth > 0:
+            rule = {"type": "regex", "regex": pattern, "select_keys": clf.fields}
+            classes.append([cat.parts, rule])
+    return classes[::-1]
+
+
+def build_pushdown_query(
+    hostname: str, by: str, clf: Optional[Classifier] = None
+) -> str:
+    """
+    Builds a query that returns the total time per category (``by="category"``,
+    categorized with the rules of ``clf``) or per app (``by="app"``), merged on
+    the server instead of returning every event.
+    """
+    if by == "category":
+        assert clf
+        classes = _query2_literal(_query2_classes(clf))
+        aggregation = f"classes = {classes};\n" + _query_merge_by_category
+    elif by == "app":
+        aggregation = _query_merge_by_app
+    else:
+        raise ValueError(f"Unknown aggregation: {by}")
+    return build_query(hostname) + "\n" + aggregation
+
+
+@requires_init_classes
+def time_per_category_pushdown(
+    awc: ActivityWatchClient,
+    hostname: str,
+    since: datetime,
+    end: datetime,
+    max_category_depth: int = 3,
+) -> typing.Counter[str]:
+    """Like ``time_per_category(classify(get_events(...)))``, computed by aw-server"""
+    clf = classifier
+    assert clf  # just to quiet typechecker, checked by decorator
+    query = build_pushdown_query(hostname, "category", clf)
+    result = awc.query(
+        query,
+        timeperiods=[(since.astimezone(timezone.utc), end.astimezone(timezone.utc))],
+    )
+    time_per_hier: typing.Counter[str] = Counter()
+    for e in result[0]:
+        parts = e["data"]["$category"][:max_category_depth]
+        time_per_hier[f" {hier_sep} ".join(parts)] += e["duration"]
+    return _unfold_time_per_category(time_per_hier)
+
+
+def time_per_app_pushdown(
+    awc: ActivityWatchClient, hostname: str, since: datetime, end: datetime
+) -> typing.Counter[str]:
+    """Like ``time_per_app(get_events(...))``, computed by aw-server"""
+    query = build_pushdown_query(hostname, "app")
+    result = awc.query(
+        query,
+        timeperiods=[(since.astimezone(timezone.utc), end.astimezone(timezone.utc))],
+    )
+    return Counter({e["data"]["app"]: e["duration"] for e in result[0]})
+
+
+def test_pushdown(make_events):
+    from aw_datastore import Datastore, storages
+    from aw_query import query2
+
+    start = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    titles = ["GitHub", "YouTube", "Nothing", 'Say "hi" on Twitter']
+    data = {"app": ["app0", "app1"], "title": titles}
+    events = make_events(60, timedelta(minutes=1), timedelta(minutes=1), data, start)
+    ds = Datastore(storages.MemoryStorage, testing=True)
+    window = ds.create_bucket("aw-watcher-window_host", "window", "test", "host")
+    window.insert(events)
+    afk = ds.create_bucket("aw-watcher-afk_host", "afk", "test", "host")
+    afk.insert(
+        Event(timestamp=start, duration=timedelta(hours=1), data={"status": "not-afk"})
+    )
+
+    class Client:
+        def query(self, query, timeperiods):
+            # Serialized like the events in a response from aw-server
+            return [
+                [e.to_json_dict() for e in query2.query("test", query, s, e, ds)]
+                for s, e in timeperiods
+            ]
+
+    awc = typing.cast(ActivityWatchClient, Client())
+    end = start + timedelta(hours=1)
+    _init_classes(
+        new_classes=[
+            ("GitHub", "Programming", "Work"),
+            (r"You\w+", "Video", "Media"),
+            ('"hi"', "Social Media", "Media"),
+            ("Nothing", "Work", None),
+        ]
+    )
+    expected = time_per_category(classify([Event(**e) for e in events]))
+    assert time_per_category_pushdown(awc, "host", start, end) == expected
+    assert time_per_app_pushdown(awc, "host", start, end) == time_per_app(events)
+
+
+toggl_timezone = "Europe/Stockholm"
+
+
+def _get_events_toggl(
+    since: datetime, filepath: str, tz: Optional[str] = None
+) -> List[Event]:
+    """
+    Loads the time entries of a Toggl CSV export made in the timezone ``tz``
+    (default: ``toggl_timezone``).
+
+    Columns are parsed as a whole, and entries are filtered by ``since`` before
+    they are turned into events.
+    """
+    tz = tz or toggl_timezone
+    df = pd.read_csv(filepath, encoding="utf-8-sig", dtype=str, keep_default_na=False)
+
+    def parse(s: str) -> pd.Series:
+        dt = pd.to_datetime(
+            df.pop(f"{s} date") + " " + df.pop(f"{s} time"), format="%Y-%m-%d %H:%M:%S"
+        )
+        # Times repeated by DST transitions are taken as standard time
+        dt = dt.dt.tz_localize(
+            tz, ambiguous=np.zeros(len(dt), dtype=bool), nonexistent="shift_forward"
+        )
+        return dt.dt.tz_convert("UTC")
+
+    start, end = parse("Start"), parse("End")
+    mask = start > pd.Timestamp(since.astimezone(timezone.utc))
+    df, start, end = df[mask], start[mask], end[mask]
+
+    df = df.drop(columns=["User", "Email", "Duration"])
+    df["app"] = df["Project"]
+    df["title"] = df["Description"]
+    durations = (end - start).dt.total_seconds()
+    return [
+        Event(timestamp=ts, duration=timedelta(seconds=secs), data=data)
+        for ts, secs, data in zip(
+            start.dt.to_pydatetime(), durations.tolist(), df.to_dict("records")
+        )
+    ]
+
+
+def test_get_events_toggl(tmp_path):
+    filepath = tmp_path / "toggl.csv"
+    filepath.write_text(
+        "\ufeffUser,Email,Client,Project,Task,Description,Billable,Start date,"
+        "Start time,End date,End time,Duration,Tags,Amount ()\n"
+        "Erik,e@example.com,,Work,,Old,No,2018-01-01,10:00:00,2018-01-01,11:00:00,"
+        "01:00:00,,\n"
+        'Erik,e@example.com,,Work,,"Meeting, with comma",No,2018-06-01,10:00:00,'
+        "2018-06-01,11:30:00,01:30:00,,\n",
+        encoding="utf-8",
+    )
+    since = datetime(2018, 3, 1, tzinfo=timezone.utc)
+    (event,) = _get_events_toggl(since, str(filepath))
+    assert event.timestamp == datetime(2018, 6, 1, 8, tzinfo=timezone.utc)
+    assert event.duration == timedelta(minutes=90)
+    assert event.data["title"] == "Meeting, with comma"
+    assert event.data["app"] == "Work"
+    assert "Email" not in event.data
+
+    (event,) = _get_events_toggl(since, str(filepath), tz="UTC")
+    assert event.timestamp == datetime(2018, 6, 1, 10, tzinfo=timezone.utc)
+
+    # The default is looked up when called, so it can be configured
+    global toggl_timezone
+    default, toggl_timezone = toggl_timezone, "UTC"
+    try:
+        (event,) = _get_events_toggl(since, str(filepath))
+    finally:
+        toggl_timezone = default
+    assert event.timestamp == datetime(2018, 6, 1, 10, tzinfo=timezone.utc)
 
 
 def _get_events_smartertime(since: datetime, filepath: str = "auto") -> List[Event]:
@@ -369,75 +1554,495 @@ def _get_events_smartertime(since: datetime, filepath: str = "auto") -> List[Eve
         filepath = sorted(glob("data/private/smartertime_export_*.awbucket.json"))[-1]
 
     print(f"Loading smartertime data from {filepath}")
+    since = since.astimezone(timezone.utc)
+    events = []
     with open(filepath) as f:
-        data = json.load(f)
-        events = [Event(**e) for e in data["events"]]
+        for record in _iter_json_array(f, "events"):
+            # Filter out no-events and non-phone events
+            activity = record["data"]["activity"]
+            if not any(s in activity for s in ["phone:", "call:"]):
+                continue
+
+            # Filter out events before `since`
+            record["timestamp"] = iso8601.parse_date(record["timestamp"])
+            if record["timestamp"] <= since:
+                continue
+
+            # Normalize to window-bucket data schema
+            record["data"]["app"] = activity
+            record["data"]["title"] = activity
+            events.append(Event(**record))
 
-    # Filter out events before `since`
-    events = [e for e in events if since.astimezone(timezone.utc) < e.timestamp]
+    return events
 
-    # Filter out no-events and non-phone events
-    events = [
-        e for e in events if any(s in e.data["activity"] for s in ["phone:", "call:"])
+
+def _iter_json_array(
+    f: typing.TextIO, key: str, chunk_size: int = 2**16
+) -> Iterator[dict]:
+    """
+    Yields the items of the array ``key`` of the JSON object in ``f`` one by one,
+    without loading the whole document.
+    """
+    decoder = json.JSONDecoder()
+    buf = ""
+    while True:
+        chunk = f.read(chunk_size)
+        buf += chunk
+        match = re.search(rf'"{key}"\s*:\s*\[', buf)
+        if match:
+            buf = buf[match.end() :]
+            break
+        elif not chunk:
+            raise ValueError(f"No array {key} in {f.name}")
+
+    pos = 0
+    while True:
+        while pos < len(buf) and buf[pos] in " \t\r\n,":
+            pos += 1
+        if buf.startswith("]", pos):
+            return
+        try:
+            item, pos = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            # The item continues in the next chunk
+            chunk = f.read(chunk_size)
+            if not chunk:
+                raise
+            buf = buf[pos:] + chunk
+            pos = 0
+            continue
+        yield item
+
+
+def test_get_events_smartertime(tmp_path):
+    start = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    activities = ["phone: Signal", "call: Mom", "phone: Off", "nothing"]
+    records = [
+        {
+            "timestamp": (start + timedelta(hours=i)).isoformat(),
+            "duration": 600,
+            "data": {"activity": activities[i % 4]},
+        }
+        for i in range(1000)
     ]
+    filepath = tmp_path / "smartertime_export.awbucket.json"
+    filepath.write_text(json.dumps({"id": "smartertime", "events": records}, indent=2))
+
+    since = start + timedelta(hours=99)
+    events = _get_events_smartertime(since, str(filepath))
+    assert len(events) == 675
+    assert events[0].timestamp == start + timedelta(hours=100)
+    assert events[0].data == {
+        "activity": "phone: Signal",
+        "app": "phone: Signal",
+        "title": "phone: Signal",
+    }
+
+    # Items span chunks
+    with open(filepath) as f:
+        assert list(_iter_json_array(f, "events", chunk_size=7)) == records
+
 
-    # Normalize to window-bucket data schema
+segment_cache_dir = "./.cache/events"
+
+# Days are treated as complete a while after they end, to leave time for late heartbeats
+_segment_grace = timedelta(minutes=10)
+
+
+def _clip_events(events: List[Event], start: datetime, end: datetime) -> List[Event]:
+    """Trims events to the period between ``start`` and ``end``"""
+    clipped = []
     for e in events:
-        e.data["app"] = e.data["activity"]
-        e.data["title"] = e.data["app"]
+        e_start = max(e.timestamp, start)
+        e_end = min(e.timestamp + e.duration, end)
+        if e_start < e_end:
+            clipped.append(
+                Event(id=e.id, timestamp=e_start, duration=e_end - e_start, data=e.data)
+            )
+    return clipped
 
-    return events
 
+def _query_days(
+    awc: ActivityWatchClient, query: str, days: List[datetime], jobs: int = 4
+) -> List[List[dict]]:
+    """
+    Runs the query for each of the days, returns the results in the same order.
 
-@memory.cache(ignore=["awc"])
-def get_events(
+    Days are sent in chunks of a week (or of a day, if there are fewer weeks than
+    jobs), on up to ``jobs`` concurrent requests.
+    """
+    chunks = [list(g) for _, g in itertools.groupby(days, get_week_start)]
+    if len(chunks) < jobs:
+        chunks = [[day] for day in days]
+
+    def query_chunk(chunk: List[datetime]) -> List[List[dict]]:
+        return awc.query(query, [(day, day + timedelta(days=1)) for day in chunk])
+
+    with ThreadPoolExecutor(jobs) as pool:
+        return [r for result in pool.map(query_chunk, chunks) for r in result]
+
+
+def _get_events_segmented(
     awc: ActivityWatchClient,
     hostname: str,
     since: datetime,
     end: datetime,
-    include_smartertime="auto",
-    include_toggl=None,
+    cache_dir: str = segment_cache_dir,
+    jobs: int = 4,
 ) -> List[Event]:
+    """
+    Returns the result of the query for ``hostname``, assembled from per-day segments.
+
+    Segments are whole days (UTC) clipped to the day bounds. Segments of days that
+    are over are stored in ``cache_dir`` and never fetched again, so only missing
+    and still open days are fetched (see ``_query_days``).
+    """
     query = build_query(hostname)
-    logger.debug(f"Query:\n{query}")
+    since = since.astimezone(timezone.utc)
+    end = end.astimezone(timezone.utc)
+    segment_dir = os.path.join(
+        cache_dir, hashlib.sha256(query.encode()).hexdigest()[:16]
+    )
+    complete_before = datetime.now(timezone.utc) - _segment_grace
+
+    days = [day for day, _ in iter_periods(start_of_day(since), end)]
+
+    segments: Dict[datetime, List[Event]] = {}
+    for day in days:
+        path = os.path.join(segment_dir, f"{day.date().isoformat()}.pickle")
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                segments[day] = pickle.load(f)
+
+    missing = [day for day in days if day not in segments]
+    logger.debug(f"{len(days) - len(missing)} cached days, fetching {len(missing)}")
+    if missing:
+        logger.debug(f"Query:\n{query}")
+        result = _query_days(awc, query, missing, jobs)
+        os.makedirs(segment_dir, exist_ok=True)
+        for day, day_events in zip(missing, result):
+            day_end = day + timedelta(days=1)
+            segments[day] = _clip_events([Event(**e) for e in day_events], day, day_end)
+            if day_end <= complete_before:
+                path = os.path.join(segment_dir, f"{day.date().isoformat()}.pickle")
+                with open(path + ".tmp", "wb") as f:
+                    pickle.dump(segments[day], f)
+                os.replace(path + ".tmp", path)
+
+    return [e for day in days for e in segments[day]]
+
+
+def _union_sorted(sources: Sequence[Iterable[Event]]) -> Iterator[Tuple[int, Event]]:
+    """
+    Merges sorted sources of non-overlapping events into one sorted stream, with
+    the same result as reducing them with ``union_no_overlap``: parts of events
+    that overlap with events of an earlier source are cut out.
+
+    Keeps the next event of every source in a heap, so the sources are consumed
+    lazily in a single pass. Events are only copied when they are cut.
+    Yields the index of the source along with each event.
+    """
+    iterators = [iter(source) for source in sources]
+    heap: List[Tuple[datetime, int, int, Event]] = []
+    # Start of the next event of each source, for finding where a source takes over
+    next_start: List[Optional[datetime]] = [None] * len(sources)
+    counter = itertools.count()
+
+    def push(i: int, e: Optional[Event]) -> None:
+        next_start[i] = e.timestamp if e is not None else None
+        if e is not None:
+            heapq.heappush(heap, (e.timestamp, i, next(counter), e))
+
+    for i, it in enumerate(iterators):
+        push(i, next(it, None))
+
+    covered_until: Optional[datetime] = None
+    while heap:
+        _, i, _, e = heapq.heappop(heap)
+        start = e.timestamp
+        stop = e.timestamp + e.duration
+        if covered_until and covered_until > start:
+            start = covered_until
+            if stop <= start:
+                push(i, next(iterators[i], None))
+                continue
+
+        takeover = min((s for s in next_start[:i] if s is not None), default=None)
+        if takeover is not None and takeover < stop:
+            # An earlier source takes over, continue with the rest afterwards
+            if start < takeover:
+                yield i, _cut_event(e, start, takeover)
+                covered_until = takeover
+            push(i, _cut_event(e, takeover, stop))
+        else:
+            yield i, _cut_event(e, start, stop)
+            covered_until = stop
+            push(i, next(iterators[i], None))
+
+
+def _cut_event(e: Event, start: datetime, stop: datetime) -> Event:
+    if start == e.timestamp and stop == e.timestamp + e.duration:
+        return e
+    return Event(id=e.id, timestamp=start, duration=stop - start, data=e.data)
+
+
+def test_union_sorted():
+    import random
+
+    random.seed(0)
+    start = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    sources = []
+    for i in range(4):
+        t = start
+        source = []
+        for _ in range(50):
+            t += timedelta(minutes=random.randint(0, 20))
+            duration = timedelta(minutes=random.randint(1, 30))
+            source.append(Event(timestamp=t, duration=duration, data={"source": i}))
+            t += duration
+        sources.append(source)
+
+    merged = [e for _, e in _union_sorted(sources)]
+    assert all(
+        e1.timestamp + e1.duration <= e2.timestamp
+        for e1, e2 in zip(merged[:-1], merged[1:])
+    )
+
+    # Every minute is covered by the earliest source that has an event then
+    def owners(events):
+        minutes: Dict[datetime, int] = {}
+        for e in events:
+            for m in range(int(e.duration.total_seconds()) // 60):
+                minutes.setdefault(e.timestamp + timedelta(minutes=m), e.data["source"])
+        return minutes
+
+    assert owners(merged) == owners(e for source in sources for e in source)
+
+    # The example from the docstring of union_no_overlap
+    def event(a, b, source):
+        return Event(
+            timestamp=start + timedelta(minutes=a),
+            duration=timedelta(minutes=b - a),
+            data={"source": source},
+        )
 
-    result = awc.query(query, timeperiods=[(since, end)])
-    events = [Event(**e) for e in result[0]]
+    events1 = [event(0, 3, 1), event(7, 9, 1), event(14, 17, 1)]
+    events2 = [event(1, 5, 2), event(11, 17, 2), event(20, 22, 2)]
+    assert [
+        (e.timestamp, e.duration) for _, e in _union_sorted([events1, events2])
+    ] == [(e.timestamp, e.duration) for e in union_no_overlap(events1, events2)]
 
+
+def get_events(
+    awc: ActivityWatchClient,
+    hostname: Union[str, List[str]],
+    since: datetime,
+    end: datetime,
+    include_smartertime="auto",
+    include_toggl=None,
+    cache_dir: str = segment_cache_dir,
+    toggl_tz: Optional[str] = None,
+) -> List[Event]:
+    """
+    Returns the events of one or several hosts, merged with the events from
+    smartertime and Toggl without overlap and clipped to the range. Earlier hosts
+    take precedence, then smartertime, then Toggl. The Toggl export is read in
+    the timezone ``toggl_tz`` (see ``_get_events_toggl``).
+    """
+    # The sources are independent network and disk I/O, so they are loaded
+    # concurrently, each host separately
+    hostnames = [hostname] if isinstance(hostname, str) else hostname
+    loaders: List[Tuple[str, Callable[[], List[Event]]]] = [
+        (host, partial(_get_events_segmented, awc, host, since, end, cache_dir))
+        for host in hostnames
+    ]
     if include_smartertime:
-        events = union_no_overlap(
-            events, _get_events_smartertime(since, filepath=include_smartertime)
+        loaders.append(
+            (
+                "smartertime",
+                partial(_get_events_smartertime, since, include_smartertime),
+            )
         )
-        events = sorted(events, key=lambda e: e.timestamp)
-
     if include_toggl:
-        events = union_no_overlap(
-            events, _get_events_toggl(since, filepath=include_toggl)
+        loaders.append(
+            ("toggl", partial(_get_events_toggl, since, include_toggl, toggl_tz))
         )
-        events = sorted(events, key=lambda e: e.timestamp)
 
-    # Filter by time
-    events = [
-        e
-        for e in events
-        if since.astimezone(timezone.utc) < e.timestamp
-        and e.timestamp + e.duration < end.astimezone(timezone.utc)
+    def load(loader: Tuple[str, Callable[[], List[Event]]]) -> List[Event]:
+        name, f = loader
+        t = perf_counter()
+        # Already sorted for aw-server, which makes sorting cheap
+        events = sorted(f(), key=lambda e: e.timestamp)
+        logger.debug(
+            f"{name}: loaded {len(events)} events in {perf_counter() - t:.2f}s"
+        )
+        return events
+
+    with ThreadPoolExecutor(len(loaders)) as pool:
+        sources = list(pool.map(load, loaders))
+    names = [name for name, _ in loaders]
+
+    since = since.astimezone(timezone.utc)
+    end = end.astimezone(timezone.utc)
+    kept = [timedelta()] * len(sources)
+    events = []
+    for i, e in _union_sorted(sources):
+        kept[i] += e.duration
+        # Clip to the range (segments start at midnight, so events at the ends
+        # of the range are cut rather than dropped), and filter out events
+        # without data (which sometimes happens for whatever reason)
+        e_start = max(e.timestamp, since)
+        e_end = min(e.timestamp + e.duration, end)
+        if not (e_start < e_end and e.data):
+            continue
+        e = _cut_event(e, e_start, e_end)
+        if "app" not in e.data:
+            if "url" in e.data:
+                e.data["app"] = urlparse(e.data["url"]).netloc
+            else:
+                print("Unexpected event: ", e)
+        events.append(e)
+
+    if len(sources) > 1:
+        for name, duration in zip(names, kept):
+            logger.info(f"{name}: {duration} after merging")
+    return events
+
+
+incremental_state_path = "./.cache/classify-incremental.json"
+
+
+@requires_init_classes
+def time_per_category_incremental(
+    fetch: Callable[[datetime, datetime], List[Event]],
+    key: str,
+    start: datetime,
+    end: datetime,
+    state_path: str = incremental_state_path,
+) -> typing.Counter[str]:
+    """
+    Like ``time_per_category``, but keeps per-day aggregates between runs.
+
+    ``fetch(since, end)`` returns the events of a period (such as
+    ``get_events`` for a host), ``key`` identifies the source in the state file.
+    Days that are over are persisted together with a fingerprint of the rules,
+    so later runs only fetch and classify the days not persisted yet, or
+    everything if the rules changed.
+    The range is handled in days (UTC), ``start`` is rounded down.
+    """
+    assert classifier  # just to quiet typechecker, checked by decorator
+
+    start = start_of_day(start.astimezone(timezone.utc))
+    end = end.astimezone(timezone.utc)
+    now = datetime.now(timezone.utc)
+
+    states = {}
+    if os.path.exists(state_path):
+        with open(state_path) as f:
+            states = json.load(f)
+    state = states.get(key)
+    if not state or state["rules_fingerprint"] != classifier.fingerprint:
+        if state:
+            logger.info("Rules changed, reclassifying everything")
+        state = {"rules_fingerprint": classifier.fingerprint, "days": {}}
+
+    # Days cut short by ``end`` are never taken from the state, they are
+    # fetched (up to ``end``) along with the days that aren't persisted yet
+    days = list(iter_periods(start, end))
+    missing = [
+        (day_start, day_end)
+        for day_start, day_end in days
+        if day_end - day_start < timedelta(days=1)
+        or day_start.date().isoformat() not in state["days"]
     ]
-    assert all(since.astimezone(timezone.utc) < e.timestamp for e in events)
-    assert all(e.timestamp + e.duration < end.astimezone(timezone.utc) for e in events)
+    runs: List[Tuple[datetime, datetime]] = []
+    for day_start, day_end in missing:
+        if runs and runs[-1][1] == day_start:
+            runs[-1] = (runs[-1][0], day_end)
+        else:
+            runs.append((day_start, day_end))
 
-    # Filter out events without data (which sometimes happens for whatever reason)
-    events = [e for e in events if e.data]
+    # Time per (non-unfolded) category hierarchy of each fetched day. Events are
+    # clipped to the run and split at midnight, so every day gets its own part.
+    fetched: Dict[str, Dict[str, float]] = {
+        day_start.date().isoformat(): {} for day_start, _ in missing
+    }
+    for run_start, run_end in runs:
+        events = classify(fetch(run_start, run_end))
+        logger.info(f"Classified {len(events)} events from {run_start} to {run_end}")
+        for e in events:
+            cat_hier = e.data["$category_hierarchy"]
+            e_start = max(e.timestamp.astimezone(timezone.utc), run_start)
+            e_end = min(e.timestamp.astimezone(timezone.utc) + e.duration, run_end)
+            for piece_start, piece_end in iter_periods(e_start, e_end):
+                time_per_hier = fetched[piece_start.date().isoformat()]
+                time_per_hier[cat_hier] = (
+                    time_per_hier.get(cat_hier, 0)
+                    + (piece_end - piece_start).total_seconds()
+                )
 
-    for event in events:
-        if "app" not in event.data:
-            if "url" in event.data:
-                event.data["app"] = urlparse(event.data["url"]).netloc
-            else:
-                print("Unexpected event: ", event)
+    # Persist the days that are over (leaving time for late heartbeats, like the
+    # segment cache) and have been fetched completely
+    complete_before = now - _segment_grace
+    for day_start, day_end in missing:
+        if day_end - day_start == timedelta(days=1) and day_end <= complete_before:
+            day = day_start.date().isoformat()
+            state["days"][day] = fetched[day]
+    states[key] = state
+    os.makedirs(os.path.dirname(state_path) or ".", exist_ok=True)
+    with open(state_path + ".tmp", "w") as f:
+        json.dump(states, f)
+    os.replace(state_path + ".tmp", state_path)
+
+    time_per_hier_total: typing.Counter[str] = Counter()
+    for day_start, _ in days:
+        day = day_start.date().isoformat()
+        time_per_hier_total.update(
+            fetched[day] if day in fetched else state["days"][day]
+        )
+    return _unfold_time_per_category(time_per_hier_total)
 
-    events = [e for e in events if e.data]
-    return events
+
+def test_time_per_category_incremental(tmp_path, make_events):
+    _init_classes("categories.example.toml")
+    start = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    data = {"app": ["Firefox"], "title": ["GitHub", "YouTube", "Nothing"]}
+    events = make_events(20, timedelta(hours=5), timedelta(hours=1), data, start)
+    fetched = []
+
+    def fetch(since, end):
+        fetched.append((since, end))
+        return [Event(**e) for e in events if since <= e.timestamp < end]
+
+    state_path = str(tmp_path / "state.json")
+    end = datetime(2020, 1, 6, tzinfo=timezone.utc)
+    expected = time_per_category(classify([Event(**e) for e in events]))
+    assert time_per_category_incremental(fetch, "host", start, end, state_path) == (
+        expected
+    )
+
+    # The second run has nothing left to fetch
+    assert time_per_category_incremental(fetch, "host", start, end, state_path) == (
+        expected
+    )
+    assert len(fetched) == 1
+
+    # Days before a persisted range are fetched, the persisted ones aren't
+    earlier = start - timedelta(days=2)
+    time_per_category_incremental(fetch, "host", earlier, end, state_path)
+    assert fetched[-1] == (earlier, start)
+
+    # A mid-day end only counts the events until then
+    mid_day = datetime(2020, 1, 2, 12, tzinfo=timezone.utc)
+    time_per = time_per_category_incremental(fetch, "host", start, mid_day, state_path)
+    assert fetched[-1] == (mid_day - timedelta(hours=12), mid_day)
+    assert sum(s for c, s in time_per.items() if " -> " not in c) == 8 * 3600
+
+    # Changed rules trigger a full reclassification
+    _init_classes(new_classes=[("GitHub", "Programming", None)])
+    time_per = time_per_category_incremental(fetch, "host", start, end, state_path)
+    assert fetched[-1] == (start, end)
+    assert time_per["Uncategorized"] == 20 * 3600
 
 
 def test_hostname():
@@ -468,6 +2073,31 @@ def _datetime_arg(s: str) -> datetime:
 def _build_argparse(parser):
     parser.add_argument("--start", type=_datetime_arg)
     parser.add_argument("--end", type=_datetime_arg)
+    parser.add_argument(
+        "--hostname",
+        action="append",
+        help="Host to report on, can be given several times (default: this host)",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Only fetch and classify events since the last run (summary only)",
+    )
+    parser.add_argument(
+        "--pushdown",
+        action="store_true",
+        help="Let aw-server sum up the time (summary/apps, without Toggl/smartertime)",
+    )
+    parser.add_argument(
+        "--toggl-timezone",
+        help=f"Timezone the Toggl export was made in (default: {toggl_timezone})",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="Number of processes to classify events with (one chunk per day)",
+    )
 
     subparsers = parser.add_subparsers(dest="cmd2")
     subparsers.add_parser("summary")
@@ -509,6 +2139,8 @@ day_offset = timedelta(hours=4)
 
 
 def _plot_category_daily_trend(events, categories):
+    import matplotlib.pyplot as plt
+
     for cat in categories:
         events_cat = [e for e in events if cat in e.data["$category_hierarchy"]]
         ts = pd.Series(
@@ -532,8 +2164,17 @@ def _plot_category_daily_trend(events, categories):
     plt.ylim(0)
 
 
+def _show_or_save_plot(save: Optional[str]) -> None:
+    import matplotlib.pyplot as plt
+
+    if save:
+        plt.savefig(save, bbox_inches="tight")
+    else:
+        plt.show()
+
+
 def _main(args):
-    _init_classes("categories.toml")
+    _init_classes("categories.toml", cache=True)
 
     if args.cmd2 in ["summary", "summary_plot", "apps", "cat", "cat_plot"]:
         if not args.end:
@@ -541,20 +2182,73 @@ def _main(args):
         if not args.start:
             how_far_back = timedelta(hours=1 * 12)
             args.start = args.end - how_far_back
+        hostnames = args.hostname or [socket.gethostname()]
+        hostname = hostnames[0] if len(hostnames) == 1 else hostnames
+        awc = ActivityWatchClient("aw-research-classify")
+        include_toggl = "./data/private/Toggl_time_entries_2017-12-17_to_2018-11-11.csv"
+
+        time_per: Optional[typing.Counter[str]] = None
+        if args.incremental and args.cmd2 == "summary":
+            time_per = time_per_category_incremental(
+                lambda since, end: get_events(
+                    awc,
+                    hostname,
+                    since,
+                    end,
+                    include_toggl=include_toggl,
+                    toggl_tz=args.toggl_timezone,
+                ),
+                ",".join(hostnames),
+                args.start,
+                args.end,
+            )
+        elif args.pushdown and len(hostnames) > 1:
+            # Overlap between hosts can't be removed on the server
+            print("--pushdown only supports a single --hostname")
+            return
+        elif args.pushdown and args.cmd2 == "summary":
+            time_per = time_per_category_pushdown(
+                awc, hostnames[0], args.start, args.end
+            )
+        elif args.pushdown and args.cmd2 == "apps":
+            time_per = time_per_app_pushdown(awc, hostnames[0], args.start, args.end)
+        if time_per is not None:
+            # The roots of the hierarchy sum up to the total
+            total = sum(s for c, s in time_per.items() if " -> " not in c)
+            print(f"Total time: {timedelta(seconds=total)}")
+            for c, s in time_per.most_common():
+                print(pprint_secs_hhmmss(s) + f"    {c}")
+            return
+
         events = get_events(
+            awc,
+            hostname,
             args.start,
             args.end,
-            include_toggl="./data/private/Toggl_time_entries_2017-12-17_to_2018-11-11.csv",
+            include_toggl=include_toggl,
+            toggl_tz=args.toggl_timezone,
         )
         _print_summary(events)
 
-        events = classify(events, include_app=False)
+        time_per_cat = None
+        if args.jobs > 1:
+            events, time_per_cat = classify_parallel(
+                events, args.jobs, include_app=False
+            )
+        else:
+            events = classify(events, include_app=False)
+            assert classifier
+            cache_info = classifier.cache_info()
+            logger.info(
+                f"Classified {len(events)} events, "
+                f"{cache_info.misses} distinct (cache hits: {cache_info.hits})"
+            )
         # pprint([e.data["$tags"] for e in classify(events)])
         if args.cmd2 in ["summary", "apps"]:
             print(f"Total time: {sum((e.duration for e in events), timedelta(0))}")
             if args.cmd2 == "summary":
-                time_per = time_per_category(events)
-            elif args.cmd2 == "apps":
+                time_per = time_per_cat or time_per_category(events)
+            else:
                 time_per = time_per_app(events)
             for c, s in time_per.most_common():
                 print(pprint_secs_hhmmss(s) + f"    {c}")
@@ -562,16 +2256,10 @@ def _main(args):
             _print_category(events, args.category, 30)
         elif args.cmd2 == "cat_plot":
             _plot_category_daily_trend(events, args.category)
-            if args.save:
-                plt.savefig(args.save, bbox_inches="tight")
-            else:
-                plt.show()
+            _show_or_save_plot(args.save)
         elif args.cmd2 == "summary_plot":
             _plot_category_hierarchy_sunburst(events)
-            if args.save:
-                plt.savefig(args.save, bbox_inches="tight")
-            else:
-                plt.show()
+            _show_or_save_plot(args.save)
     else:
         print(f"unknown subcommand to classify: {args.cmd2}")
 
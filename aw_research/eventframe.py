@@ -0,0 +1,231 @@
+import sys
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from aw_core.models import Event
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+US = timedelta(microseconds=1)
+
+Column = Tuple[np.ndarray, np.ndarray]
+
+
+class EventFrame:
+    """
+    Events stored column-wise, as a compact alternative to lists of ``Event``.
+
+    ``start`` and ``duration`` are int64 microseconds (since the epoch, UTC).
+    String data fields are dictionary-encoded: each column is a pair of int32
+    codes, one per event (-1 where the field is missing), and an array of the
+    distinct values the codes point into.
+    """
+
+    fields = ("app", "title", "url")
+
+    def __init__(
+        self,
+        start: np.ndarray,
+        duration: np.ndarray,
+        columns: Optional[Dict[str, Column]] = None,
+    ):
+        self.start = np.asarray(start, dtype=np.int64)
+        self.duration = np.asarray(duration, dtype=np.int64)
+        self.columns: Dict[str, Column] = columns or {}
+        assert len(self.start) == len(self.duration)
+        assert all(len(codes) == len(self) for codes, _ in self.columns.values())
+
+    def __len__(self) -> int:
+        return len(self.start)
+
+    def __repr__(self) -> str:
+        return f"<EventFrame with {len(self)} events, columns {list(self.columns)}>"
+
+    @property
+    def stop(self) -> np.ndarray:
+        return self.start + self.duration
+
+    @property
+    def nbytes(self) -> int:
+        """Memory used by the arrays, including the distinct strings"""
+        n = self.start.nbytes + self.duration.nbytes
+        for codes, values in self.columns.values():
+            n += codes.nbytes + values.nbytes
+            n += sum(map(sys.getsizeof, values))
+        return n
+
+    def column(self, name: str) -> np.ndarray:
+        """Decodes a column, with None where the field is missing"""
+        codes, values = self.columns[name]
+        return np.concatenate([values, np.array([None], dtype=object)])[codes]
+
+    def with_column(
+        self, name: str, codes: np.ndarray, values: np.ndarray
+    ) -> "EventFrame":
+        columns = dict(self.columns)
+        columns[name] = (np.asarray(codes, dtype=np.int32), values)
+        return EventFrame(self.start, self.duration, columns)
+
+    def drop(self, names: Iterable[str]) -> "EventFrame":
+        names = set(names)
+        columns = {k: v for k, v in self.columns.items() if k not in names}
+        return EventFrame(self.start, self.duration, columns)
+
+    def take(self, indexer: np.ndarray) -> "EventFrame":
+        """Selects events by a boolean mask or integer indices, sharing the dictionaries"""
+        return EventFrame(
+            self.start[indexer],
+            self.duration[indexer],
+            {
+                k: (codes[indexer], values)
+                for k, (codes, values) in self.columns.items()
+            },
+        )
+
+    def sort(self) -> "EventFrame":
+        return self.take(np.argsort(self.start, kind="stable"))
+
+    @classmethod
+    def concat(cls, frames: Sequence["EventFrame"]) -> "EventFrame":
+        """Concatenates frames, merging the dictionaries of their columns"""
+        columns = {}
+        for name in dict.fromkeys(name for f in frames for name in f.columns):
+            dictionaries = [f.columns[name][1] for f in frames if name in f.columns]
+            merged_codes, values = pd.factorize(np.concatenate(dictionaries))
+            remapped, offset = [], 0
+            for f in frames:
+                if name not in f.columns:
+                    remapped.append(np.full(len(f), -1, dtype=np.int32))
+                    continue
+                codes, dictionary = f.columns[name]
+                mapping = merged_codes[offset : offset + len(dictionary)]
+                remapped.append(np.append(mapping, -1)[codes].astype(np.int32))
+                offset += len(dictionary)
+            columns[name] = (np.concatenate(remapped), np.asarray(values, dtype=object))
+        return cls(
+            np.concatenate([f.start for f in frames]),
+            np.concatenate([f.duration for f in frames]),
+            columns,
+        )
+
+    @classmethod
+    def from_events(
+        cls, events: Sequence[Event], fields: Sequence[str] = fields
+    ) -> "EventFrame":
+        start = np.fromiter(
+            ((e.timestamp - EPOCH) // US for e in events), np.int64, len(events)
+        )
+        duration = np.fromiter(
+            (e.duration // US for e in events), np.int64, len(events)
+        )
+        columns = {
+            field: _encode([e.data.get(field) for e in events]) for field in fields
+        }
+        return cls(start, duration, columns)
+
+    def to_events(self) -> List[Event]:
+        starts = (EPOCH + US * int(us) for us in self.start)
+        durations = (US * int(us) for us in self.duration)
+        decoded = [(name, self.column(name).tolist()) for name in self.columns]
+        return [
+            Event(
+                timestamp=start,
+                duration=duration,
+                data={name: col[i] for name, col in decoded if col[i] is not None},
+            )
+            for i, (start, duration) in enumerate(zip(starts, durations))
+        ]
+
+    @classmethod
+    def from_dataframe(cls, df: pd.DataFrame) -> "EventFrame":
+        """
+        Takes a DataFrame with ``timestamp`` and ``duration`` columns (timedeltas,
+        or seconds as in the JSON representation of events), the remaining string
+        columns become data fields.
+        """
+        timestamp = pd.to_datetime(df["timestamp"], utc=True)
+        start = (timestamp - pd.Timestamp(EPOCH)) // pd.Timedelta(US)
+        if pd.api.types.is_timedelta64_dtype(df["duration"]):
+            duration = df["duration"] // pd.Timedelta(US)
+        else:
+            duration = (df["duration"] * 1e6).round()
+        columns = {
+            name: _encode(df[name])
+            for name in df.columns
+            if name not in ("timestamp", "duration")
+        }
+        return cls(start.to_numpy(np.int64), duration.to_numpy(np.int64), columns)
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """Converts to a DataFrame with the data fields as categorical columns"""
+        df = pd.DataFrame(
+            {
+                "timestamp": pd.to_datetime(self.start, unit="us", utc=True),
+                "duration": pd.to_timedelta(self.duration, unit="us"),
+            }
+        )
+        for name, (codes, values) in self.columns.items():
+            df[name] = pd.Categorical.from_codes(codes, categories=values)
+        return df
+
+
+def _encode(values) -> Column:
+    codes, uniques = pd.factorize(np.asarray(values, dtype=object))
+    return codes.astype(np.int32), np.asarray(uniques, dtype=object)
+
+
+def _example_events() -> List[Event]:
+    start = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    return [
+        Event(
+            timestamp=start + timedelta(minutes=i),
+            duration=timedelta(seconds=30 + i),
+            data={"app": f"app{i % 3}", "title": f"title {i % 5}"},
+        )
+        for i in range(10)
+    ] + [Event(timestamp=start, duration=timedelta(0.5), data={"url": "a.com"})]
+
+
+def test_eventframe_events():
+    events = _example_events()
+    frame = EventFrame.from_events(events)
+    assert len(frame) == 11
+    assert len(frame.columns["app"][1]) == 3
+    assert frame.column("url")[0] is None
+    assert frame.to_events() == events
+    assert frame.take(frame.duration > 35_000_000).to_events() == [
+        e for e in events if e.duration > timedelta(seconds=35)
+    ]
+    assert frame.sort().to_events() == sorted(events, key=lambda e: e.timestamp)
+
+    concatenated = EventFrame.concat(
+        [frame, EventFrame.from_events(events[::-1], fields=["title"])]
+    )
+    assert len(concatenated.columns["title"][1]) == 5
+    assert concatenated.to_events() == events + [
+        (
+            Event(
+                timestamp=e.timestamp,
+                duration=e.duration,
+                data={"title": e.data["title"]},
+            )
+            if "title" in e.data
+            else Event(timestamp=e.timestamp, duration=e.duration)
+        )
+        for e in events[::-1]
+    ]
+
+
+def test_eventframe_dataframe():
+    events = _example_events()
+    frame = EventFrame.from_events(events)
+    df = frame.to_dataframe()
+    assert list(df.columns) == ["timestamp", "duration", "app", "title", "url"]
+    assert df["timestamp"][1] == events[1].timestamp
+    assert EventFrame.from_dataframe(df).to_events() == events
+
+    # As loaded from the JSON representation of events
+    df = pd.DataFrame([e.to_json_dict() for e in events])
+    df = pd.concat([df, pd.json_normalize(df.pop("data"))], axis=1).drop(columns="id")
+    assert EventFrame.from_dataframe(df).to_events() == events
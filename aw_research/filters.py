@@ -1,23 +1,31 @@
 import logging
-from typing import List
+from typing import List, TypeVar
 
 from aw_core.models import Event
 from aw_client import ActivityWatchClient
 
+from .eventframe import EventFrame
+
+Events = TypeVar("Events", List[Event], EventFrame)
+
 
 logger = logging.getLogger(__name__)
 
 
-def filter_short(events, threshold: float = 1):
+def filter_short(events: Events, threshold: float = 1) -> Events:
     # TODO: Try to fill hole in timeline where events have been removed
     #       (if events before and after where are the same)
     #       Useful for filtering AFK data and to make data look "smoother".
     #       Might be something for another function
+    if isinstance(events, EventFrame):
+        return events.take(events.duration > threshold * 1_000_000)
     return [e for e in events if e.duration.total_seconds() > threshold]
 
 
-def filter_datafields(events: List[Event], fields: List[str]):
+def filter_datafields(events: Events, fields: List[str]) -> Events:
     """Filters away specific datafield from every event in a list"""
+    if isinstance(events, EventFrame):
+        return events.drop(fields)
     for e in events:
         for field in fields:
             if field in e.data:
@@ -51,6 +59,23 @@ def test_filter_short():
     filter_short(events, threshold=30)
 
 
+def test_filter_eventframe():
+    from datetime import datetime, timedelta, timezone
+
+    events = [
+        Event(
+            timestamp=datetime(2020, 1, 1, tzinfo=timezone.utc),
+            duration=timedelta(seconds=s),
+            data={"title": "Some title", "app": "app"},
+        )
+        for s in [0.5, 1, 1.5, 30]
+    ]
+    frame = EventFrame.from_events(events)
+    assert filter_short(frame).to_events() == filter_short(events)
+    frame = filter_datafields(frame, ["title"])
+    assert frame.to_events() == filter_datafields(events, ["title"])
+
+
 if __name__ == "__main__":
     test_filter_data()
     test_filter_short()
@@ -0,0 +1,164 @@
+"""
+Set algebra on periods of time, for combining e.g. AFK and audible periods
+client-side.
+
+A set of periods is a pair of int64 arrays ``(start, stop)`` in microseconds since
+the epoch (like ``EventFrame``), sorted and non-overlapping. The operations take
+time linear in their inputs (plus their output), locating the periods of one set
+in the other with ``np.searchsorted``.
+"""
+
+from typing import List, Tuple, TypeVar, Union
+
+import numpy as np
+from aw_core.models import Event
+from numpy.typing import ArrayLike
+
+from .eventframe import EPOCH, US, EventFrame
+
+Periods = Tuple[np.ndarray, np.ndarray]
+Events = TypeVar("Events", List[Event], EventFrame)
+
+_never = np.iinfo(np.int64).min
+_forever = np.iinfo(np.int64).max
+
+
+def from_events(events: Union[List[Event], EventFrame]) -> Periods:
+    """The periods covered by events, which may overlap"""
+    if not isinstance(events, EventFrame):
+        events = EventFrame.from_events(events, fields=())
+    return _normalize(events.start, events.stop)
+
+
+def to_events(periods: Periods) -> List[Event]:
+    return [
+        Event(timestamp=EPOCH + US * int(start), duration=US * int(stop - start))
+        for start, stop in zip(*periods)
+    ]
+
+
+def _normalize(start: ArrayLike, stop: ArrayLike) -> Periods:
+    """Sorts periods and merges the ones that overlap or touch"""
+    start = np.asarray(start, dtype=np.int64)
+    stop = np.asarray(stop, dtype=np.int64)
+    nonempty = stop > start
+    start, stop = start[nonempty], stop[nonempty]
+    # Stable sorting is a merge sort, which is linear on concatenated sorted runs
+    order = np.argsort(start, kind="stable")
+    start, stop = start[order], stop[order]
+    latest_stop = np.maximum.accumulate(stop)
+    first = np.ones(len(start), dtype=bool)
+    first[1:] = start[1:] > latest_stop[:-1]
+    last = np.roll(first, -1)
+    return start[first], latest_stop[last]
+
+
+def _clip(start: np.ndarray, stop: np.ndarray, periods: Periods):
+    """
+    Clips each of the (possibly overlapping) intervals to the periods.
+    Returns the index of the interval of each piece, and its start and stop.
+    """
+    p_start, p_stop = periods
+    first = np.searchsorted(p_stop, start, "right")
+    last = np.searchsorted(p_start, stop, "left")
+    counts = np.maximum(last - first, 0)
+    index = np.repeat(np.arange(len(start)), counts)
+    offsets = np.arange(len(index)) - np.repeat(np.cumsum(counts) - counts, counts)
+    period = first[index] + offsets
+    piece_start = np.maximum(start[index], p_start[period])
+    piece_stop = np.minimum(stop[index], p_stop[period])
+    nonempty = piece_stop > piece_start
+    return index[nonempty], piece_start[nonempty], piece_stop[nonempty]
+
+
+def union(a: Periods, b: Periods) -> Periods:
+    return _normalize(np.concatenate([a[0], b[0]]), np.concatenate([a[1], b[1]]))
+
+
+def intersection(a: Periods, b: Periods) -> Periods:
+    _, start, stop = _clip(a[0], a[1], b)
+    return start, stop
+
+
+def complement(periods: Periods) -> Periods:
+    """The gaps between the periods, including before the first and after the last"""
+    start, stop = periods
+    gaps = np.concatenate([[_never], stop]), np.concatenate([start, [_forever]])
+    return _normalize(*gaps)
+
+
+def difference(a: Periods, b: Periods) -> Periods:
+    return intersection(a, complement(b))
+
+
+def filter_period_intersect(events: Events, periods: Periods) -> Events:
+    """
+    Clips events to the periods, splitting them where they span several, like
+    ``aw_transform.filter_period_intersect``. The events may overlap, the pieces
+    are returned sorted by time.
+    """
+    if isinstance(events, EventFrame):
+        frame = events
+    else:
+        frame = EventFrame.from_events(events, fields=())
+    index, start, stop = _clip(frame.start, frame.stop, periods)
+    # Pieces come in order of event, then period
+    order = np.lexsort((index, start))
+    index, start, stop = index[order], start[order], stop[order]
+
+    if isinstance(events, EventFrame):
+        return EventFrame(start, stop - start, events.take(index).columns)
+    return [
+        Event(
+            timestamp=EPOCH + US * int(piece_start),
+            duration=US * int(piece_stop - piece_start),
+            data=dict(events[i].data),
+        )
+        for i, piece_start, piece_stop in zip(index.tolist(), start, stop)
+    ]
+
+
+def test_set_algebra():
+    a = _normalize([0, 10, 15, 40], [10, 20, 30, 50])
+    assert [x.tolist() for x in a] == [[0, 40], [30, 50]]
+    b = _normalize([5, 25, 45], [8, 42, 60])
+    assert [x.tolist() for x in union(a, b)] == [[0], [60]]
+    assert [x.tolist() for x in intersection(a, b)] == [
+        [5, 25, 40, 45],
+        [8, 30, 42, 50],
+    ]
+    assert [x.tolist() for x in difference(a, b)] == [[0, 8, 42], [5, 25, 45]]
+    assert [x.tolist() for x in difference(b, a)] == [[30, 50], [40, 60]]
+
+
+def test_filter_period_intersect():
+    from datetime import datetime, timedelta, timezone
+
+    start = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    minutes = lambda m: timedelta(minutes=m)  # noqa: E731
+    afk = [
+        Event(timestamp=start, duration=minutes(10), data={"status": "not-afk"}),
+        Event(timestamp=start + minutes(30), duration=minutes(10)),
+    ]
+    audible = [Event(timestamp=start + minutes(5), duration=minutes(30))]
+    active = union(from_events(afk), from_events(audible))
+    assert to_events(active) == [Event(timestamp=start, duration=minutes(40))]
+
+    # Contained events are kept (in part), overlapping events are split
+    windows = [
+        Event(timestamp=start, duration=minutes(50), data={"title": "long"}),
+        Event(timestamp=start + minutes(2), duration=minutes(1), data={"title": "a"}),
+        Event(timestamp=start + minutes(38), duration=minutes(4), data={"title": "b"}),
+    ]
+    gaps = difference(active, from_events(audible))
+    expected = [
+        Event(timestamp=start, duration=minutes(5), data={"title": "long"}),
+        Event(timestamp=start + minutes(2), duration=minutes(1), data={"title": "a"}),
+        Event(
+            timestamp=start + minutes(35), duration=minutes(5), data={"title": "long"}
+        ),
+        Event(timestamp=start + minutes(38), duration=minutes(2), data={"title": "b"}),
+    ]
+    assert filter_period_intersect(windows, gaps) == expected
+    frame = filter_period_intersect(EventFrame.from_events(windows), gaps)
+    assert frame.drop(["app", "url"]).to_events() == expected
@@ -14,23 +14,21 @@ from aw_client import ActivityWatchClient
 from aw_research.redact import redact_words
 from aw_research.algorithmia import run_sentiment, run_LDA
 from aw_research.merge import merge_close_and_similar
+from aw_research.util import compute_total_overlap
 from aw_research.classify import _main as _main_classify
 from aw_research.classify import _build_argparse as _build_argparse_classify
+from aw_research.archive import _main as _main_archive
+from aw_research.archive import _build_argparse as _build_argparse_archive
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
 def assert_no_overlap(events):
-    overlap = False
-    events = sorted(events, key=lambda e: e.timestamp)
-    for e1, e2 in zip(events[:-1], events[1:]):
-        e1_end = e1.timestamp + e1.duration
-        gap = e2.timestamp - e1_end
-        if gap < timedelta(0):
-            logger.warning("Events overlapped: {}".format(gap))
-            overlap = True
-    assert not overlap
+    n_overlaps, total_overlap = compute_total_overlap(events)
+    if n_overlaps:
+        logger.warning(f"{n_overlaps} events overlapped, totalling: {total_overlap}")
+    assert not n_overlaps
 
 
 def _get_window_events(n=1000):
@@ -162,6 +160,8 @@ def main():
     subparsers.add_parser("heartbeat")
     classify = subparsers.add_parser("classify")
     _build_argparse_classify(classify)
+    archive = subparsers.add_parser("archive")
+    _build_argparse_archive(archive)
 
     args = parser.parse_args()
 
@@ -177,5 +177,7 @@ def main():
         _main_heartbeat_reduce()
     elif args.cmd == "classify":
         _main_classify(args)
+    elif args.cmd == "archive":
+        _main_archive(args)
     else:
         parser.print_usage()
@@ -1,31 +1,39 @@
 from datetime import timedelta
-from copy import deepcopy
 from difflib import SequenceMatcher
+from typing import Iterable, Iterator, List
+
+from aw_core.models import Event
 
 
 def similar(a, b):
     return SequenceMatcher(None, a, b).ratio()
 
 
-def merge_close_and_similar(events, pulsetime=10):
+def merge_close_and_similar(events: List[Event], pulsetime=10) -> List[Event]:
     """
     Merges close window events with similar window title.
 
     Useful when a window is constantly making small changes
     to its window title that you don't care about.
     """
-    events = deepcopy(events)
     events = sorted(events, key=lambda e: e.timestamp)
+    return list(iter_merge_close_and_similar(events, pulsetime))
 
-    merged_events = [events[0]]
-
-    for i in range(1, len(events)):
-        e1 = merged_events[-1]
-        e2 = events[i]
 
+def iter_merge_close_and_similar(
+    events: Iterable[Event], pulsetime=10
+) -> Iterator[Event]:
+    """
+    Streaming version of ``merge_close_and_similar``, for events already sorted by
+    timestamp. Each merged event is yielded as soon as the next event can't be merged
+    into it. Only events that are extended are copied, the rest are passed through.
+    """
+    e1 = None
+    copied = False
+    for e2 in events:
         merged = False
 
-        if e1.data["app"] == e2.data["app"]:
+        if e1 is not None and e1.data["app"] == e2.data["app"]:
             gap = e2.timestamp - (e1.timestamp + e1.duration)
             assert gap >= timedelta(0)
 
@@ -33,10 +41,16 @@ def merge_close_and_similar(events, pulsetime=10):
             if gap <= timedelta(seconds=pulsetime):
                 simscore = similar(e1.data["title"], e2.data["title"])
                 if simscore > 0.9:
+                    if not copied:
+                        e1 = Event(**e1)
+                        copied = True
                     e1.duration = (e2.timestamp + e2.duration) - e1.timestamp
                     merged = True
 
         if not merged:
-            merged_events.append(e2)
+            if e1 is not None:
+                yield e1
+            e1, copied = e2, False
 
-    return merged_events
+    if e1 is not None:
+        yield e1
@@ -1,14 +1,19 @@
 import logging
 from datetime import (
+    date,
     datetime,
     time,
     timedelta,
     timezone,
 )
-from typing import List, Tuple
+from typing import Iterator, List, NamedTuple, Optional, Tuple, Union
 
+import numpy as np
 import pandas as pd
 from aw_core import Event
+from numpy.typing import ArrayLike
+
+from .eventframe import EPOCH, US, EventFrame
 
 logger = logging.getLogger(__name__)
 
@@ -37,13 +42,12 @@ def test_next_hour() -> None:
 
 
 def split_event_on_hour(event: Event) -> List[Event]:
-    hours_crossed = (event.timestamp + event.duration).hour - event.timestamp.hour
-    if hours_crossed == 0:
-        return [event]
-    else:
-        _next_hour = next_hour(event.timestamp)
-        event1, event_n = split_event_on_time(event, _next_hour)
-        return [event1, *split_event_on_hour(event_n)]
+    events = []
+    stop = event.timestamp + event.duration
+    while next_hour(event.timestamp) < stop:
+        event1, event = split_event_on_time(event, next_hour(event.timestamp))
+        events.append(event1)
+    return events + [event]
 
 
 def test_split_event_on_hour() -> None:
@@ -60,6 +64,15 @@ def test_split_event_on_hour() -> None:
     split_events = split_event_on_hour(e)
     assert len(split_events) == 3
 
+    # Crossing midnight, and longer than a day
+    e = Event(
+        timestamp=datetime(2019, 1, 1, 23, 30, tzinfo=timezone.utc),
+        duration=timedelta(hours=25),
+    )
+    split_events = split_event_on_hour(e)
+    assert len(split_events) == 26
+    assert split_events[-1].timestamp == datetime(2019, 1, 3, tzinfo=timezone.utc)
+
 
 def start_of_day(dt: datetime) -> datetime:
     today = dt.date()
@@ -79,14 +92,103 @@ def is_in_same_week(dt1: datetime, dt2: datetime) -> bool:
     return get_week_start(dt1) == get_week_start(dt2)
 
 
-def split_into_weeks(start: datetime, end: datetime) -> List[Tuple[datetime, datetime]]:
-    if start == end:
-        return []
-    elif is_in_same_week(start, end):
-        return [(start, end)]
+def _next_period(dt: datetime, freq: Union[str, timedelta]) -> datetime:
+    """The start of the period after the one ``dt`` is in, in the timezone of ``dt``"""
+    if isinstance(freq, timedelta):
+        # A fixed stride is elapsed time, also across DST changes
+        if dt.tzinfo is None:
+            return dt + freq
+        return (dt.astimezone(timezone.utc) + freq).astimezone(dt.tzinfo)
+    day = dt.date()
+    if freq == "day":
+        day += timedelta(days=1)
+    elif freq == "week":
+        day += timedelta(days=7 - day.weekday())
+    elif freq == "month":
+        day = date(day.year + day.month // 12, day.month % 12 + 1, 1)
+    else:
+        raise ValueError(f"unknown period: {freq}")
+    split = datetime.combine(day, time())
+    if dt.tzinfo is None:
+        return split
+    if hasattr(dt.tzinfo, "localize"):
+        # pytz timezones only get the offset of the new day by localizing
+        split = dt.tzinfo.localize(split)
     else:
-        split = get_week_start(start) + timedelta(days=7)
-        return [(start, split)] + split_into_weeks(split, end)
+        split = split.replace(tzinfo=dt.tzinfo)
+    # Resolve midnights skipped by DST changes
+    return split.astimezone(timezone.utc).astimezone(dt.tzinfo)
+
+
+def iter_periods(
+    start: datetime, end: datetime, freq: Union[str, timedelta] = "day"
+) -> Iterator[Tuple[datetime, datetime]]:
+    """
+    Yields ``(start, end)`` of each period ("day", "week", "month" or a timedelta
+    stride) from ``start`` until ``end``, with the first and last periods clipped.
+    Periods follow the calendar in the timezone of ``start``.
+    """
+    while start < end:
+        split = min(_next_period(start, freq), end)
+        yield start, split
+        start = split
+
+
+def test_iter_periods() -> None:
+    from zoneinfo import ZoneInfo
+
+    tz = ZoneInfo("Europe/Stockholm")
+    periods = list(
+        iter_periods(
+            datetime(2019, 3, 30, 12, tzinfo=tz), datetime(2019, 4, 2, tzinfo=tz)
+        )
+    )
+    utc = timezone.utc
+    assert [b.astimezone(utc) - a.astimezone(utc) for a, b in periods] == [
+        timedelta(hours=12),
+        timedelta(hours=23),
+        timedelta(hours=24),
+    ]
+    assert periods[-1][0] == datetime(2019, 4, 1, tzinfo=tz)
+
+    periods = list(
+        iter_periods(datetime(2019, 11, 15), datetime(2020, 3, 1), freq="month")
+    )
+    assert [a.month for a, _ in periods] == [11, 12, 1, 2]
+
+    periods = list(
+        iter_periods(
+            datetime(2019, 3, 31, tzinfo=tz),
+            datetime(2019, 3, 31, 4, tzinfo=tz),
+            freq=timedelta(hours=1),
+        )
+    )
+    assert [a.hour for a, _ in periods] == [0, 1, 3]
+
+    # Decade-long ranges are no problem
+    start = datetime(2010, 1, 1, tzinfo=timezone.utc)
+    end = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    assert sum(1 for _ in iter_periods(start, end)) == 3652
+
+
+def test_iter_periods_pytz() -> None:
+    import pytz
+
+    tz = pytz.timezone("Europe/Stockholm")
+    periods = list(
+        iter_periods(
+            tz.localize(datetime(2019, 3, 30, 12)), tz.localize(datetime(2019, 4, 2))
+        )
+    )
+    assert [(a.day, a.hour, a.utcoffset()) for a, _ in periods] == [
+        (30, 12, timedelta(hours=1)),
+        (31, 0, timedelta(hours=1)),
+        (1, 0, timedelta(hours=2)),
+    ]
+
+
+def split_into_weeks(start: datetime, end: datetime) -> List[Tuple[datetime, datetime]]:
+    return list(iter_periods(start, end, "week"))
 
 
 def test_split_into_weeks() -> None:
@@ -110,13 +212,7 @@ def test_split_into_weeks() -> None:
 
 
 def split_into_days(start: datetime, end: datetime) -> List[Tuple[datetime, datetime]]:
-    if start == end:
-        return []
-    elif start.date() == end.date():
-        return [(start, end)]
-    else:
-        split = datetime.combine(start.date(), time()) + timedelta(days=1)
-        return [(start, split)] + split_into_days(split, end)
+    return list(iter_periods(start, end, "day"))
 
 
 def test_split_into_days() -> None:
@@ -125,49 +221,84 @@ def test_split_into_days() -> None:
         print(dtstart, dtend)
     assert len(split) == 4
 
+    # tzaware
+    split = split_into_days(
+        datetime(2019, 1, 3, 12, tzinfo=timezone.utc),
+        datetime(2019, 1, 6, 0, 2, tzinfo=timezone.utc),
+    )
+    assert all(dt.tzinfo == timezone.utc for period in split for dt in period)
+
+
+def _event_arrays(
+    events: Union[List[Event], EventFrame],
+) -> Tuple[np.ndarray, np.ndarray]:
+    """The start and duration of events in microseconds, as in ``EventFrame``"""
+    if isinstance(events, EventFrame):
+        return events.start, events.duration
+    start = np.array([(e.timestamp - EPOCH) // US for e in events], dtype=np.int64)
+    duration = np.array([e.duration // US for e in events], dtype=np.int64)
+    return start, duration
+
+
+class Overlaps(NamedTuple):
+    n_overlaps: int
+    """Number of events starting before an earlier event has ended"""
+    duration: int
+    """Time covered by two or more events, in microseconds"""
+    max_concurrency: int
+    pairs: np.ndarray
+    """Index pairs of each overlapping event and the earlier event it overlaps the
+    most (the one ending last), as a (n_overlaps, 2) array of indices into the input"""
+
+
+def find_overlaps(start: ArrayLike, duration: ArrayLike) -> Overlaps:
+    """Finds overlaps between intervals, sweeping over their (sorted) starts and ends"""
+    start = np.asarray(start, dtype=np.int64)
+    stop = start + np.asarray(duration, dtype=np.int64)
+    n = len(start)
+    order = None
+    if np.any(start[1:] < start[:-1]):
+        order = np.argsort(start, kind="stable")
+        start, stop = start[order], stop[order]
+
+    # An event overlaps if it starts before the latest end of the earlier events
+    latest_end = np.maximum.accumulate(stop)
+    latest = np.maximum.accumulate(np.where(stop == latest_end, np.arange(n), 0))
+    overlapping = np.flatnonzero(start[1:] < latest_end[:-1]) + 1
+    pairs = np.stack([latest[overlapping - 1], overlapping], axis=1)
+    if order is not None:
+        pairs = order[pairs]
+
+    # Concurrency between each consecutive pair of starts and ends (ends first on
+    # ties, so that adjacent events don't count)
+    nonempty = stop > start
+    times = np.concatenate([stop[nonempty], start[nonempty]])
+    deltas = np.repeat([-1, 1], np.count_nonzero(nonempty))
+    points = np.lexsort((deltas, times))
+    concurrency = np.cumsum(deltas[points])
+    lengths = np.diff(times[points])
+    return Overlaps(
+        n_overlaps=len(overlapping),
+        duration=int(lengths[concurrency[:-1] >= 2].sum()),
+        max_concurrency=int(concurrency.max(initial=0)),
+        pairs=pairs,
+    )
+
 
-def verify_no_overlap(events: List[Event]) -> None:
-    events = sorted(events, key=lambda e: e.timestamp)
-    try:
-        assert all(
-            [
-                e1.timestamp + e1.duration <= e2.timestamp
-                for e1, e2 in zip(events[:-1], events[1:])
-            ]
-        )
-    except AssertionError:
-        n_overlaps, total_overlap = compute_total_overlap(events)
+def verify_no_overlap(events: Union[List[Event], EventFrame]) -> None:
+    overlaps = find_overlaps(*_event_arrays(events))
+    if overlaps.n_overlaps:
+        total_overlap = timedelta(microseconds=overlaps.duration)
         print(
-            f"[WARNING] Found {n_overlaps} events overlapping, totalling: {total_overlap}"
+            f"[WARNING] Found {overlaps.n_overlaps} events overlapping, totalling: {total_overlap}"
         )
 
 
-def compute_total_overlap(events: List[Event]) -> Tuple[int, timedelta]:
-    events = sorted(events, key=lambda e: e.timestamp)
-    n_overlaps = 0
-    total_overlap = timedelta()
-    i, j = 0, 1
-    assert len(events) > 1
-    while j < len(events):
-        e1, e2 = events[i], events[j]
-        if e1.timestamp + e1.duration > e2.timestamp:
-            n_overlaps += 1
-            overlap_start = max(e1.timestamp, e2.timestamp)
-            overlap_end = min(e1.timestamp + e1.duration, e2.timestamp + e2.duration)
-            total_overlap += overlap_end - overlap_start
-            j += 1
-            logger.debug("j+")
-        else:
-            if j - i > 1:
-                # if j isn't directly ahead of i, we can skip ahead
-                i += 1
-                logger.debug("i+")
-            else:
-                # if j is directly ahead of i, we can step both forward
-                i += 1
-                j += 1
-                logger.debug("i=j+")
-    return n_overlaps, total_overlap
+def compute_total_overlap(
+    events: Union[List[Event], EventFrame],
+) -> Tuple[int, timedelta]:
+    overlaps = find_overlaps(*_event_arrays(events))
+    return overlaps.n_overlaps, timedelta(microseconds=overlaps.duration)
 
 
 def test_compute_total_overlap() -> None:
@@ -216,33 +347,223 @@ def test_compute_total_overlap() -> None:
             duration=timedelta(minutes=15),
         ),
     ]
-    assert compute_total_overlap(events) == (2, timedelta(minutes=75))
+    # The nested events overlap each other, but that time is only counted once
+    assert compute_total_overlap(events) == (2, timedelta(minutes=60))
+
+
+def test_find_overlaps() -> None:
+    start = np.array([0, 10, 20, 30, 60, 70, 100])
+    duration = np.array([50, 15, 20, 0, 10, 5, 10])
+    overlaps = find_overlaps(start, duration)
+    assert overlaps.n_overlaps == 3
+    assert overlaps.duration == 30
+    assert overlaps.max_concurrency == 3
+    assert overlaps.pairs.tolist() == [[0, 1], [0, 2], [0, 3]]
+
+    # Pairs index into the input, also when it isn't sorted
+    order = np.array([6, 2, 0, 5, 1, 3, 4])
+    unsorted = find_overlaps(start[order], duration[order])
+    assert unsorted[:3] == overlaps[:3]
+    assert order[unsorted.pairs].tolist() == overlaps.pairs.tolist()
+
+    assert find_overlaps(start[4:], duration[4:]).n_overlaps == 0
+    assert find_overlaps([], []).max_concurrency == 0
+
+
+_calendar_bins = {"day": 1, "week": 7}
+_fixed_bins = {"hour": timedelta(hours=1)}
+
+
+def _wall_floor(ts: pd.Timestamp, freq: str, offset: timedelta) -> pd.Timestamp:
+    """The naive local time of the start of the day/week that ``ts`` is in"""
+    day = (ts.tz_localize(None) - offset).normalize()
+    return day - pd.Timedelta(days=day.weekday()) if freq == "week" else day
+
+
+def _bin_edges(
+    first: int,
+    last: int,
+    freq: Union[str, timedelta],
+    tz: str,
+    offset: timedelta,
+) -> np.ndarray:
+    """Bin edges in microseconds (since the epoch, UTC) covering ``[first, last)``"""
+    first_ts = pd.Timestamp(first, unit="us", tz="UTC").tz_convert(tz)
+    last_ts = pd.Timestamp(max(last - 1, first), unit="us", tz="UTC").tz_convert(tz)
+    if isinstance(freq, str) and freq in _calendar_bins:
+        # Calendar days vary in length over DST changes, so step in wall time
+        step = pd.Timedelta(days=_calendar_bins[freq])
+        wall = pd.date_range(
+            _wall_floor(first_ts, freq, offset),
+            _wall_floor(last_ts, freq, offset) + step,
+            freq=step,
+        )
+        local = (wall + offset).tz_localize(
+            tz, ambiguous=np.zeros(len(wall), dtype=bool), nonexistent="shift_forward"
+        )
+    else:
+        width = pd.Timedelta(
+            _fixed_bins.get(freq, freq) if isinstance(freq, str) else freq
+        )
+        day = (_wall_floor(first_ts, "day", offset) + offset).tz_localize(
+            tz, ambiguous=False, nonexistent="shift_forward"
+        )
+        origin = day + (first_ts - day) // width * width
+        n = max(-(-(last_ts - origin) // width), 1)
+        local = pd.date_range(origin, periods=n + 1, freq=width)
+    return local.as_unit("us").asi8
+
+
+def bin_durations(
+    start: ArrayLike,
+    duration: ArrayLike,
+    freq: Union[str, timedelta] = "day",
+    tz: str = "UTC",
+    offset: timedelta = timedelta(0),
+    since: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+) -> pd.Series:
+    """
+    Sums up the time of events into bins of ``freq`` ("hour", "day", "week" or a
+    timedelta) in the timezone ``tz``, with days starting at ``offset`` past
+    midnight. Events are split at the bin edges.
+
+    Takes ``start`` and ``duration`` as microseconds, like ``EventFrame``, and returns
+    the seconds per bin, indexed by the start of the bins (from ``since`` until
+    ``end`` if given, else covering all events).
+    """
+    start = np.asarray(start, dtype=np.int64)
+    stop = start + np.asarray(duration, dtype=np.int64)
+    if (since is None or end is None) and not len(start):
+        # Without events, the bins can only cover a range with both bounds
+        return pd.Series([], index=pd.DatetimeIndex([], tz=tz), dtype=float)
+    first = start.min() if since is None else (since - EPOCH) // US
+    last = stop.max() if end is None else (end - EPOCH) // US
+    edges = _bin_edges(int(first), int(last), freq, tz, offset)
+    if since is not None or end is not None:
+        edges = np.clip(edges, first, last)
+    n_bins = len(edges) - 1
+
+    # The range of bins each event falls into, and the part of it in each bin
+    keep = (stop > edges[0]) & (start < edges[-1]) & (stop > start)
+    kept_start, kept_stop = start[keep], stop[keep]
+    first_bin = np.searchsorted(edges, kept_start, "right") - 1
+    last_bin = np.searchsorted(edges, kept_stop, "left") - 1
+    first_bin = np.clip(first_bin, 0, n_bins - 1)
+    last_bin = np.clip(last_bin, 0, n_bins - 1)
+    counts = last_bin - first_bin + 1
+    event = np.repeat(np.arange(len(kept_start)), counts)
+    offsets = np.arange(len(event)) - np.repeat(np.cumsum(counts) - counts, counts)
+    bins = first_bin[event] + offsets
+    part = np.minimum(kept_stop[event], edges[bins + 1]) - np.maximum(
+        kept_start[event], edges[bins]
+    )
+    seconds = np.bincount(bins, weights=part, minlength=n_bins) / 1e6
+
+    index = pd.to_datetime(edges[:-1], unit="us", utc=True).tz_convert(tz)
+    return pd.Series(seconds, index=index)
+
+
+def test_bin_durations() -> None:
+    def us(dt: datetime) -> int:
+        return (dt - EPOCH) // US
+
+    hour = 3_600_000_000
+    start = datetime(2019, 1, 1, 23, 30, tzinfo=timezone.utc)
+    # Crosses midnight, and lasts longer than a day
+    ts = bin_durations([us(start)], [hour], "hour")
+    assert ts.tolist() == [1800, 1800]
+    assert ts.index[1] == datetime(2019, 1, 2, tzinfo=timezone.utc)
+    ts = bin_durations([us(start)], [25 * hour], "day")
+    assert ts.tolist() == [1800, 24 * 3600, 1800]
+
+    # Days start at the offset, and in the given timezone
+    ts = bin_durations([us(start)], [hour], "day", offset=timedelta(hours=4))
+    assert ts.tolist() == [3600]
+    ts = bin_durations([us(start)], [hour], "day", tz="Europe/Stockholm")
+    assert ts.tolist() == [3600]
+    assert str(ts.index[0]) == "2019-01-02 00:00:00+01:00"
+
+    # A day with a DST change is 23 hours long
+    start = datetime(2019, 3, 30, 23, tzinfo=timezone.utc)
+    ts = bin_durations([us(start)], [48 * hour], "day", tz="Europe/Stockholm")
+    assert ts.tolist() == [3600 * 23, 3600 * 24, 3600]
+
+    # Weeks start on mondays, bins can be limited to a period
+    ts = bin_durations([us(start)], [48 * hour], "week")
+    assert ts.tolist() == [3600 * 25, 3600 * 23]
+    ts = bin_durations(
+        [us(start)],
+        [48 * hour],
+        timedelta(minutes=10),
+        since=start + timedelta(minutes=5),
+        end=start + timedelta(minutes=25),
+    )
+    assert ts.tolist() == [300, 600, 300]
+
+    # Without events, bins are only returned for a bounded range
+    assert bin_durations([], [], since=start).empty
+    assert bin_durations([], [], end=start).empty
+    ts = bin_durations([], [], "hour", since=start, end=start + timedelta(hours=2))
+    assert ts.tolist() == [0, 0]
+
+
+def _category_durations(
+    events: Union[List[Event], EventFrame], category: str
+) -> Tuple[np.ndarray, np.ndarray]:
+    if isinstance(events, EventFrame):
+        # Match the category against the distinct hierarchies only
+        codes, values = events.columns["$category_hierarchy"]
+        matching = np.array([category in v for v in values] + [False])
+        frame = events.take(matching[codes])
+        return frame.start, frame.duration
+    return _event_arrays(
+        [e for e in events if category in e.data["$category_hierarchy"]]
+    )
 
 
-# TODO: Write test that ensures timezone localization is handled correctly
-def categorytime_per_day(events, category):
-    events = [e for e in events if category in e.data["$category_hierarchy"]]
-    if not events:
+def categorytime_per_day(
+    events: Union[List[Event], EventFrame],
+    category: str,
+    tz: Optional[str] = None,
+    offset: timedelta = timedelta(0),
+) -> pd.Series:
+    """
+    Hours per day spent in ``category``, for days in ``tz`` starting at ``offset``
+    (like ``classify.day_offset``). Without ``tz``, days are in UTC and the index
+    is naive.
+    """
+    start, duration = _category_durations(events, category)
+    if not len(start):
         raise Exception("No events to calculate on")
-    ts = pd.Series(
-        [e.duration.total_seconds() / 3600 for e in events],
-        index=pd.DatetimeIndex([e.timestamp for e in events]).tz_localize(None),
-    )
-    return ts.resample("1D").apply("sum")
+    ts = bin_durations(start, duration, "day", tz or "UTC", offset) / 3600
+    if tz is None:
+        ts.index = ts.index.tz_localize(None)
+    return ts
+
+
+def test_categorytime_per_day_eventframe(make_events):
+    data = {"$category_hierarchy": ["Work -> Programming", "Media"]}
+    events = make_events(20, timedelta(hours=7), timedelta(minutes=30), data)
+    frame = EventFrame.from_events(events, fields=["$category_hierarchy"])
+    expected = categorytime_per_day(events, "Work")
+    assert categorytime_per_day(frame, "Work").equals(expected)
+    assert expected.sum() == 5
 
 
-# TODO: Refactor into categorytime_per_hour? (that you just pass a day of events to)
 def categorytime_during_day(
-    events: List[Event], category: str, day: datetime
+    events: Union[List[Event], EventFrame], category: str, day: datetime
 ) -> pd.Series:
-    events = [e for e in events if category in e.data["$category_hierarchy"]]
-    events = [e for e in events if e.timestamp > day]
-    _events = []
-    for e in events:
-        _events.extend(split_event_on_hour(e))
-    events = _events
-    ts = pd.Series(
-        [e.duration.total_seconds() / 3600 for e in events],
-        index=pd.DatetimeIndex([e.timestamp for e in events]),
+    """Hours per hour of ``day`` spent in ``category``, in the timezone of ``day``"""
+    if day.tzinfo is None:
+        day = day.replace(tzinfo=timezone.utc)
+    start, duration = _category_durations(events, category)
+    ts = bin_durations(
+        start,
+        duration,
+        "hour",
+        str(day.tzinfo),
+        since=day,
+        end=day + timedelta(days=1),
     )
-    return ts.resample("1H").apply("sum")
+    return ts / 3600
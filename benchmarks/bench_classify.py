@@ -0,0 +1,148 @@
+"""
+Benchmarks classify throughput on synthetic window events.
+
+Compares the compiled Classifier used by ``classify.classify`` against the
+previous implementation, which compiled every rule on each call and looped
+rules x events x fields.
+
+Usage:
+    poetry run python benchmarks/bench_classify.py [--events 1000000] [--rules 300]
+"""
+
+import argparse
+import random
+import re
+import string
+from datetime import datetime, timedelta, timezone
+from time import perf_counter
+from typing import List, Optional, Tuple
+
+from aw_core.models import Event
+
+from aw_research import classify
+from aw_research.classify import (
+    _init_classes,
+    _restrict_category_depth,
+    build_category_hierarchy,
+    get_parent_categories,
+    hier_sep,
+)
+
+Rules = List[Tuple[str, str, Optional[str]]]
+
+
+def _word(rng: random.Random) -> str:
+    return "".join(rng.choices(string.ascii_lowercase, k=rng.randint(4, 9)))
+
+
+def synthetic_rules(n: int, seed: int = 0) -> Rules:
+    rng = random.Random(seed)
+    rules: Rules = []
+    for i in range(n):
+        cat = f"Cat{i}"
+        # Roughly a third of categories are nested under an earlier one
+        parent = f"Cat{rng.randrange(i)}" if i and rng.random() < 0.3 else None
+        pattern = "|".join(_word(rng).capitalize() for _ in range(rng.randint(1, 4)))
+        rules.append((pattern, cat, parent))
+    return rules
+
+
+def synthetic_events(n: int, rules: Rules, seed: int = 0) -> List[Event]:
+    rng = random.Random(seed)
+    keywords = [kw for pattern, _, _ in rules for kw in pattern.split("|")]
+    apps = ["Firefox", "Chromium", "Alacritty", "Code", "Slack", "Spotify"]
+    # Window data repeats a lot, draw from a pool of distinct titles
+    titles = [
+        " ".join(
+            [_word(rng) for _ in range(rng.randint(2, 8))]
+            + rng.choices(keywords, k=rng.randint(0, 2))
+        )
+        for _ in range(max(n // 50, 1))
+    ]
+    start = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    return [
+        Event(
+            timestamp=start + timedelta(seconds=10 * i),
+            duration=timedelta(seconds=10),
+            data={"app": rng.choice(apps), "title": rng.choice(titles)},
+        )
+        for i in range(n)
+    ]
+
+
+def _classify_legacy(events: List[Event], rules: Rules, max_category_depth=3):
+    """The classify implementation before the Classifier was introduced"""
+    for e in events:
+        e.data["$tags"] = set()
+        e.data["$category_hierarchy"] = "Uncategorized"
+
+    for re_pattern, cat, _ in rules:
+        r = re.compile(re_pattern)
+        for e in events:
+            for attr in ["title", "app", "url"]:
+                if attr not in e.data:
+                    continue
+                if cat not in e.data["$tags"] and r.findall(e.data[attr]):
+                    e.data["$tags"].add(cat)
+                    e.data["$tags"] |= get_parent_categories(cat)
+
+    for e in events:
+        for cat in e.data["$tags"]:
+            new_cat_hier = build_category_hierarchy(cat)
+            old_cat_hier = e.data["$category_hierarchy"]
+            if old_cat_hier.count(hier_sep) >= new_cat_hier.count(hier_sep):
+                continue
+            e.data["$category_hierarchy"] = new_cat_hier
+        e.data["$category_hierarchy"] = _restrict_category_depth(
+            e.data["$category_hierarchy"], max_category_depth
+        )
+
+    for e in events:
+        if not e.data["$tags"]:
+            e.data["$tags"].add("Uncategorized")
+    return events
+
+
+def _time(name: str, f, n: int) -> float:
+    t = perf_counter()
+    f()
+    elapsed = perf_counter() - t
+    print(f"{name:>10}: {elapsed:8.2f}s  {n / elapsed:12,.0f} events/s")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--events", type=int, default=1_000_000)
+    parser.add_argument("--rules", type=int, default=300)
+    parser.add_argument("--skip-legacy", action="store_true")
+    args = parser.parse_args()
+
+    rules = synthetic_rules(args.rules)
+    _init_classes(new_classes=rules)
+    events = synthetic_events(args.events, rules)
+    print(f"{args.events:,} events, {args.rules} rules")
+
+    after = _time("after", lambda: classify.classify(events), args.events)
+    result = [(e.data["$tags"], e.data["$category_hierarchy"]) for e in events]
+    info = classify.classifier.cache_info()
+    print(f"     cache: {info.hits:,} hits, {info.misses:,} misses")
+
+    # Share of (rule, event) pairs rejected by the literal prefilter
+    clf = classify.classifier
+    sample = events[:10_000]
+    searched = sum(
+        len(clf._candidates([e.data[attr] for attr in clf.fields if attr in e.data]))
+        for e in sample
+    )
+    rejected = 1 - searched / (len(clf.patterns) * len(sample))
+    print(f" prefilter: {100 * rejected:.1f}% of (rule, event) pairs rejected")
+    if not args.skip_legacy:
+        before = _time("before", lambda: _classify_legacy(events, rules), args.events)
+        legacy = [(e.data["$tags"], e.data["$category_hierarchy"]) for e in events]
+        assert [t for t, _ in result] == [t for t, _ in legacy]
+        print(f"   speedup: {before / after:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""
+Benchmarks how ``classify.classify_parallel`` scales with the number of workers.
+
+Usage:
+    poetry run python benchmarks/bench_classify_parallel.py [--events 1000000]
+"""
+
+import argparse
+from time import perf_counter
+
+from aw_research import classify
+from aw_research.classify import _init_classes, classify_parallel, time_per_category
+
+from bench_classify import synthetic_events, synthetic_rules
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--events", type=int, default=1_000_000)
+    parser.add_argument("--rules", type=int, default=300)
+    parser.add_argument("--jobs", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    rules = synthetic_rules(args.rules)
+    _init_classes(new_classes=rules)
+    events = synthetic_events(args.events, rules)
+    print(f"{args.events:,} events, {args.rules} rules")
+
+    t = perf_counter()
+    time_per_category(classify.classify(events))
+    serial = perf_counter() - t
+    print(f"  serial: {serial:8.2f}s  {args.events / serial:12,.0f} events/s")
+
+    for jobs in args.jobs:
+        t = perf_counter()
+        classify_parallel(events, jobs)
+        elapsed = perf_counter() - t
+        print(
+            f"{jobs:>2} jobs: {elapsed:8.2f}s  {args.events / elapsed:12,.0f} events/s"
+            f"  ({serial / elapsed:.2f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
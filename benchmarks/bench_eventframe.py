@@ -0,0 +1,60 @@
+"""
+Benchmarks the memory used by 5M window events as an ``EventFrame`` against a
+list of ``Event``, and the time of classifying and summarizing both.
+
+The list of events doesn't fit in memory on small machines, so its size is
+measured on a sample and extrapolated.
+
+Usage:
+    poetry run python benchmarks/bench_eventframe.py [--events 5000000] [--sample 200000]
+"""
+
+import argparse
+import tracemalloc
+from time import perf_counter
+
+from aw_research.classify import _init_classes, classify, time_per_category
+from aw_research.eventframe import EventFrame
+
+from bench_classify import synthetic_events, synthetic_rules
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--events", type=int, default=5_000_000)
+    parser.add_argument("--sample", type=int, default=200_000)
+    parser.add_argument("--rules", type=int, default=300)
+    args = parser.parse_args()
+
+    rules = synthetic_rules(args.rules)
+    _init_classes(new_classes=rules)
+
+    # Built from samples, since the full list of events may not fit in memory
+    frames = []
+    for i in range(0, args.events, args.sample):
+        n = min(args.sample, args.events - i)
+        frames.append(EventFrame.from_events(synthetic_events(n, rules, seed=i)))
+    frame = EventFrame.concat(frames)
+
+    tracemalloc.start()
+    events = synthetic_events(args.sample, rules)
+    per_event = tracemalloc.get_traced_memory()[0] / args.sample
+    tracemalloc.stop()
+
+    mib = 2**20
+    print(f"{args.events:,} events")
+    print(f"   events: {per_event * args.events / mib:8.0f} MiB  (extrapolated)")
+    print(f"    frame: {frame.nbytes / mib:8.0f} MiB")
+
+    t = perf_counter()
+    time_per_category(classify(events))
+    elapsed = perf_counter() - t
+    print(f"   events: {elapsed * args.events / args.sample:8.2f}s  (extrapolated)")
+
+    t = perf_counter()
+    time_per_category(classify(frame))
+    print(f"    frame: {perf_counter() - t:8.2f}s  classify + time_per_category")
+
+
+if __name__ == "__main__":
+    main()
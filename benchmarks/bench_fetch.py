@@ -0,0 +1,97 @@
+"""
+Benchmarks fetching events from aw-server in one request vs. in concurrent chunks
+(``classify._query_days``), against a local stand-in aw-server.
+
+The stand-in answers queries with synthetic events after an artificial latency per
+request, plus a compute time per queried day (evaluated sequentially within a request,
+like aw-server does for the timeperiods of a query).
+
+Usage:
+    poetry run python benchmarks/bench_fetch.py [--days 28] [--latency 0.05]
+"""
+
+import argparse
+import json
+import threading
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import perf_counter, sleep
+
+from aw_client import ActivityWatchClient
+
+from aw_research.classify import _query_days, build_query
+
+
+def standin_server(latency: float, per_day: float, events_per_day: int):
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            result = []
+            for period in body["timeperiods"]:
+                start, end = map(datetime.fromisoformat, period.split("/"))
+                n = round(events_per_day * (end - start) / timedelta(days=1))
+                step = (end - start) / n
+                sleep(per_day * (end - start) / timedelta(days=1))
+                result.append(
+                    [
+                        {
+                            "timestamp": (start + i * step).isoformat(),
+                            "duration": step.total_seconds(),
+                            "data": {"app": "Firefox", "title": f"Page {i}"},
+                        }
+                        for i in range(n)
+                    ]
+                )
+            sleep(latency)
+            self.send_response(200)
+            self.end_headers()
+            self.wfile.write(json.dumps(result).encode())
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("localhost", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--days", type=int, default=28)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--per-day", type=float, default=0.02)
+    parser.add_argument("--events-per-day", type=int, default=300)
+    parser.add_argument("--jobs", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    server = standin_server(args.latency, args.per_day, args.events_per_day)
+    awc = ActivityWatchClient(
+        "aw-research-bench", host="localhost", port=server.server_port
+    )
+    query = build_query("host")
+    start = datetime(2020, 1, 6, tzinfo=timezone.utc)
+    end = start + timedelta(days=args.days)
+    days = [start + timedelta(days=i) for i in range(args.days)]
+    print(
+        f"{args.days} days, {args.latency * 1000:.0f}ms latency, "
+        f"{args.per_day * 1000:.0f}ms per day"
+    )
+
+    # What get_events used to do: a single query for the whole range
+    t = perf_counter()
+    n_events = len(awc.query(query, [(start, end)])[0])
+    single = perf_counter() - t
+    print(f" single: {single:6.2f}s  ({n_events:,} events)")
+
+    for jobs in args.jobs:
+        t = perf_counter()
+        result = _query_days(awc, query, days, jobs)
+        elapsed = perf_counter() - t
+        assert sum(map(len, result)) == n_events
+        print(f"{jobs:>2} jobs: {elapsed:6.2f}s  ({single / elapsed:.2f}x)")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
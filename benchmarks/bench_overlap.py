@@ -0,0 +1,86 @@
+"""
+Benchmarks finding overlaps between 1M intervals with ``util.find_overlaps``, on
+sorted and unsorted input, against the two-pointer loop over events that
+``compute_total_overlap`` used to be (run on a sample and extrapolated).
+
+Usage:
+    poetry run python benchmarks/bench_overlap.py [--intervals 1000000] [--sample 100000]
+"""
+
+import argparse
+from datetime import timedelta
+from time import perf_counter
+
+import numpy as np
+from aw_core.models import Event
+
+from aw_research.eventframe import EPOCH, US
+from aw_research.util import find_overlaps
+
+
+def synthetic_intervals(n: int, seed: int = 0):
+    """Mostly back-to-back intervals of up to a minute, with some overlapping"""
+    rng = np.random.default_rng(seed)
+    duration = rng.integers(1, 60_000_000, n)
+    gap = rng.integers(-10_000_000, 50_000_000, n)
+    start = np.cumsum(duration + gap) - duration
+    return start, duration
+
+
+def two_pointer_overlap(events):
+    """What compute_total_overlap used to do (without the debug logging)"""
+    events = sorted(events, key=lambda e: e.timestamp)
+    n_overlaps = 0
+    total_overlap = timedelta()
+    i, j = 0, 1
+    while j < len(events):
+        e1, e2 = events[i], events[j]
+        if e1.timestamp + e1.duration > e2.timestamp:
+            n_overlaps += 1
+            overlap_start = max(e1.timestamp, e2.timestamp)
+            overlap_end = min(e1.timestamp + e1.duration, e2.timestamp + e2.duration)
+            total_overlap += overlap_end - overlap_start
+            j += 1
+        elif j - i > 1:
+            i += 1
+        else:
+            i += 1
+            j += 1
+    return n_overlaps, total_overlap
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--intervals", type=int, default=1_000_000)
+    parser.add_argument("--sample", type=int, default=100_000)
+    args = parser.parse_args()
+
+    start, duration = synthetic_intervals(args.intervals)
+    shuffled = np.random.default_rng(1).permutation(args.intervals)
+    print(f"{args.intervals:,} intervals")
+
+    t = perf_counter()
+    overlaps = find_overlaps(start, duration)
+    print(
+        f"    sorted: {perf_counter() - t:8.3f}s  ({overlaps.n_overlaps:,} overlapping)"
+    )
+
+    t = perf_counter()
+    find_overlaps(start[shuffled], duration[shuffled])
+    print(f"  unsorted: {perf_counter() - t:8.3f}s")
+
+    events = [
+        Event(timestamp=EPOCH + US * int(s), duration=US * int(d))
+        for s, d in zip(start[: args.sample], duration[: args.sample])
+    ]
+    t = perf_counter()
+    two_pointer_overlap(events)
+    elapsed = perf_counter() - t
+    print(
+        f"    events: {elapsed * args.intervals / args.sample:8.3f}s  "
+        "(two-pointer loop, extrapolated)"
+    )
+
+
+if __name__ == "__main__":
+    main()
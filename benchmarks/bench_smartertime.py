@@ -0,0 +1,90 @@
+"""
+Benchmarks time and peak memory of loading a smartertime export with
+``classify._get_events_smartertime``, against the previous implementation,
+which loaded the whole document and created an Event for every record before
+filtering.
+
+Usage:
+    poetry run python benchmarks/bench_smartertime.py [--records 200000]
+"""
+
+import argparse
+import json
+import os
+import random
+import tempfile
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+from time import perf_counter
+from typing import List
+
+from aw_core.models import Event
+
+from aw_research.classify import _get_events_smartertime
+
+
+def _get_events_smartertime_legacy(since: datetime, filepath: str) -> List[Event]:
+    with open(filepath) as f:
+        data = json.load(f)
+        events = [Event(**e) for e in data["events"]]
+    events = [e for e in events if since.astimezone(timezone.utc) < e.timestamp]
+    events = [
+        e for e in events if any(s in e.data["activity"] for s in ["phone:", "call:"])
+    ]
+    for e in events:
+        e.data["app"] = e.data["activity"]
+        e.data["title"] = e.data["app"]
+    return events
+
+
+def synthetic_export(filepath: str, records: int, seed: int = 0) -> datetime:
+    """Writes an export of back-to-back records, returns the start of the last year"""
+    rng = random.Random(seed)
+    activities = ["phone: Signal", "phone: Firefox", "call: Mom"] + [
+        f"place: {i}" for i in range(20)
+    ]
+    t = datetime(2015, 1, 1, tzinfo=timezone.utc)
+    with open(filepath, "w") as f:
+        f.write('{"id": "smartertime_export", "type": "smartertime", "events": [\n')
+        for i in range(records):
+            duration = rng.randint(30, 600)
+            record = {
+                "timestamp": t.isoformat(),
+                "duration": duration,
+                "data": {"activity": rng.choice(activities)},
+            }
+            f.write(("," if i else "") + json.dumps(record) + "\n")
+            t += timedelta(seconds=duration)
+        f.write("]}\n")
+    return t - timedelta(days=365)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--records", type=int, default=200_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        filepath = os.path.join(tmpdir, "smartertime_export.awbucket.json")
+        since = synthetic_export(filepath, args.records)
+        size = os.path.getsize(filepath) / 2**20
+        print(f"{args.records:,} records ({size:.0f} MiB), loading the last year")
+
+        for name, load in [
+            ("legacy", _get_events_smartertime_legacy),
+            ("streaming", _get_events_smartertime),
+        ]:
+            tracemalloc.start()
+            t = perf_counter()
+            events = load(since, filepath)
+            elapsed = perf_counter() - t
+            peak = tracemalloc.get_traced_memory()[1] / 2**20
+            tracemalloc.stop()
+            print(
+                f"{name:>9}: {elapsed:6.2f}s  peak {peak:7.1f} MiB"
+                f"  ({len(events):,} events)"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Benchmarks the startup time of ``aw-research classify summary`` with a 500 rule
+categories.toml, with and without the cache of prepared rules.
+
+Every run is a fresh process, which imports aw_research.classify and loads the
+rules the same way the CLI does (fetching events is not included).
+
+Usage:
+    poetry run python benchmarks/bench_startup.py [--rules 500] [--runs 5]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+from time import perf_counter
+
+import toml
+
+from bench_classify import synthetic_rules
+
+STARTUP = """
+from time import perf_counter
+t = perf_counter()
+from aw_research.classify import _init_classes
+t_import = perf_counter() - t
+t = perf_counter()
+_init_classes("categories.toml", cache={cache})
+print(t_import, perf_counter() - t)
+"""
+
+
+def write_rules_toml(filename: str, n: int) -> None:
+    categories: dict = {}
+    nodes: dict = {}
+    for pattern, cat, parent in synthetic_rules(n):
+        nodes[cat] = {"$re": pattern}
+        (nodes[parent] if parent else categories)[cat] = nodes[cat]
+    with open(filename, "w") as f:
+        toml.dump({"categories": categories}, f)
+
+
+def run(cwd: str, cache: bool):
+    env = dict(os.environ, PYTHONPATH=os.getcwd())
+    t = perf_counter()
+    out = subprocess.run(
+        [sys.executable, "-c", STARTUP.format(cache=cache)],
+        cwd=cwd,
+        env=env,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    total = perf_counter() - t
+    t_import, t_rules = map(float, out.split()[-2:])
+    return total, t_import, t_rules
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rules", type=int, default=500)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        write_rules_toml(os.path.join(tmpdir, "categories.toml"), args.rules)
+        print(f"{args.rules} rules, best of {args.runs} runs")
+        # The first cached run populates the cache
+        run(tmpdir, cache=True)
+        for name, cache in [("no cache", False), ("cached", True)]:
+            total, t_import, t_rules = min(
+                (run(tmpdir, cache) for _ in range(args.runs)), key=lambda r: r[0]
+            )
+            print(
+                f"{name:>9}: {total * 1000:7.1f}ms total, "
+                f"{t_import * 1000:7.1f}ms import, {t_rules * 1000:6.1f}ms rules"
+            )
+
+
+if __name__ == "__main__":
+    main()
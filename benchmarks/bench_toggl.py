@@ -0,0 +1,98 @@
+"""
+Benchmarks loading a Toggl CSV export with ``classify._get_events_toggl``,
+against the previous implementation, which parsed every row into an Event
+(converting its timezone one by one) before filtering on ``since``.
+
+Usage:
+    poetry run python benchmarks/bench_toggl.py [--rows 100000]
+"""
+
+import argparse
+import os
+import random
+import tempfile
+from datetime import datetime, timedelta, timezone
+from time import perf_counter
+from typing import Dict, List
+
+import pytz
+from aw_core.models import Event
+
+from aw_research.classify import _get_events_toggl
+
+HEADER = (
+    "User,Email,Client,Project,Task,Description,Billable,Start date,Start time,"
+    "End date,End time,Duration,Tags,Amount ()"
+)
+
+
+def _get_events_toggl_legacy(since: datetime, filepath: str) -> List[Event]:
+    with open(filepath, "r", encoding="utf-8-sig") as f:
+        lines = f.readlines()
+        rows = [l.strip().split(",") for l in lines]
+        header = rows[0]
+        rows = rows[1:]
+        entries: List[Dict] = [{"data": dict(zip(header, row))} for row in rows]
+        for e in entries:
+            for s in ["Start", "End"]:
+                yyyy, mm, dd = map(int, e["data"].pop(f"{s} date").split("-"))
+                HH, MM, SS = map(int, e["data"].pop(f"{s} time").split(":"))
+                e["data"][s] = datetime(yyyy, mm, dd, HH, MM, SS).astimezone(
+                    pytz.timezone("Europe/Stockholm")
+                )
+            e["timestamp"] = e["data"].pop("Start")
+            e["duration"] = e["data"].pop("End") - e["timestamp"]
+            del e["data"]["User"]
+            del e["data"]["Email"]
+            del e["data"]["Duration"]
+
+            e["data"]["app"] = e["data"]["Project"]
+            e["data"]["title"] = e["data"]["Description"]
+
+    events = [Event(**e) for e in entries]
+    events = [e for e in events if since.astimezone(timezone.utc) < e.timestamp]
+    return events
+
+
+def synthetic_export(filepath: str, rows: int, seed: int = 0) -> datetime:
+    """Writes an export of back-to-back entries, returns the start of the last quarter"""
+    rng = random.Random(seed)
+    t = datetime(2015, 1, 1, 8)
+    with open(filepath, "w", encoding="utf-8-sig") as f:
+        f.write(HEADER + "\n")
+        for i in range(rows):
+            if i == rows * 3 // 4:
+                since = t
+            duration = timedelta(minutes=rng.randint(5, 120))
+            end = t + duration
+            f.write(
+                f"Erik,erik@example.com,,Project {rng.randint(0, 20)},,"
+                f"Task {rng.randint(0, 1000)},No,{t:%Y-%m-%d},{t:%H:%M:%S},"
+                f"{end:%Y-%m-%d},{end:%H:%M:%S},{str(duration).zfill(8)},,\n"
+            )
+            t = end + timedelta(minutes=rng.randint(0, 60))
+    return since.replace(tzinfo=timezone.utc)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        filepath = os.path.join(tmpdir, "toggl.csv")
+        since = synthetic_export(filepath, args.rows)
+        print(f"{args.rows:,} rows, loading the last quarter")
+
+        for name, load in [
+            ("legacy", _get_events_toggl_legacy),
+            ("columnar", _get_events_toggl),
+        ]:
+            t = perf_counter()
+            events = load(since, filepath)
+            elapsed = perf_counter() - t
+            print(f"{name:>8}: {elapsed:6.2f}s  ({len(events):,} events)")
+
+
+if __name__ == "__main__":
+    main()
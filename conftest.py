@@ -0,0 +1,2 @@
+# Makes the fixtures of the tests available to the tests in the modules
+pytest_plugins = ["tests.conftest"]
@@ -2,7 +2,7 @@ from datetime import datetime, timedelta
 
 from aw_client import ActivityWatchClient
 
-from aw_transform import filter_period_intersect
+from aw_research import intervals
 
 
 def _check_nonoverlapping(events):
@@ -11,12 +11,15 @@ def _check_nonoverlapping(events):
     for e in events:
         end = e.timestamp + e.duration
         if last_end:
-            assert last_end <= end
+            assert last_end <= e.timestamp
         last_end = end
 
 
 def merge(events1, events2):
-    result = ...
+    periods = intervals.union(
+        intervals.from_events(events1), intervals.from_events(events2)
+    )
+    result = intervals.to_events(periods)
     _check_nonoverlapping(result)
     return result
 
@@ -32,12 +35,11 @@ def all_active_webactivity():
     afkevents_notafk = list(filter(lambda e: e.data["status"] == "not-afk", afkevents))
     tabevents_audible = list(filter(lambda e: "audible" in e.data and e.data["audible"], tabevents))
 
-    # TODO: Implement merge
-    # activeevents = merge(afkevents_notafk, tabevents_audible)
-    # This isn't perfect, buggy when a notafk/audible events is contained by another
-    activeevents = afkevents_notafk + tabevents_audible
+    activeevents = merge(afkevents_notafk, tabevents_audible)
 
-    return filter_period_intersect(tabevents, activeevents)
+    return intervals.filter_period_intersect(
+        tabevents, intervals.from_events(activeevents)
+    )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,91 @@
+import json
+import re
+import threading
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterator, List, Sequence, Tuple
+
+import pytest
+from aw_client import ActivityWatchClient
+from aw_core.models import Event
+
+from aw_research.classify import _clip_events
+
+StandInServer = Callable[
+    [Dict[str, List[Event]], List[Tuple[datetime, datetime]]], ActivityWatchClient
+]
+
+
+def _make_events(
+    n: int,
+    every: timedelta,
+    duration: timedelta,
+    data: Dict[str, Sequence[str]],
+    start: datetime = datetime(2020, 1, 1, tzinfo=timezone.utc),
+) -> List[Event]:
+    return [
+        Event(
+            timestamp=start + every * i,
+            duration=duration,
+            data={k: values[i % len(values)] for k, values in data.items()},
+        )
+        for i in range(n)
+    ]
+
+
+@pytest.fixture
+def make_events() -> Callable[..., List[Event]]:
+    """
+    Returns a function that makes ``n`` events starting ``every`` so often from
+    ``start``, with data fields cycling through the given values.
+    """
+    return _make_events
+
+
+@pytest.fixture
+def standin_server() -> Iterator[StandInServer]:
+    """
+    Starts stand-in aw-servers, which answer queries with the events of the
+    queried host clipped to each timeperiod, and record the timeperiods.
+    Returns a client for each, the servers are shut down after the test.
+    """
+    servers: List[ThreadingHTTPServer] = []
+
+    def start(
+        events: Dict[str, List[Event]], queried: List[Tuple[datetime, datetime]]
+    ) -> ActivityWatchClient:
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers["Content-Length"])
+                body = json.loads(self.rfile.read(length))
+                match = re.search(r'hostname = "(.*)"', "\n".join(body["query"]))
+                assert match
+                host_events = events.get(match.group(1), [])
+                periods = []
+                for period in body["timeperiods"]:
+                    since, end = period.split("/")
+                    periods.append(
+                        (datetime.fromisoformat(since), datetime.fromisoformat(end))
+                    )
+                queried.extend(periods)
+                result = [
+                    [e.to_json_dict() for e in _clip_events(host_events, *p)]
+                    for p in periods
+                ]
+                self.send_response(200)
+                self.end_headers()
+                self.wfile.write(json.dumps(result).encode())
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(("localhost", 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return ActivityWatchClient(
+            "aw-research-test", host="localhost", port=server.server_port
+        )
+
+    yield start
+    for server in servers:
+        server.shutdown()
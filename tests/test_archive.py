@@ -0,0 +1,59 @@
+from datetime import datetime, timedelta, timezone
+from typing import List, Tuple
+
+import numpy as np
+
+from aw_research import classify
+from aw_research.archive import (
+    _chunks,
+    _day_dir,
+    _next_chunk,
+    _read_meta,
+    compact,
+    import_events,
+    iter_days,
+    load,
+    read_chunk,
+    write_chunk,
+)
+from aw_research.eventframe import EventFrame
+
+
+def test_archive(tmp_path, standin_server, make_events):
+    start = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    data = {"app": ["Firefox"], "title": ["GitHub", "YouTube"]}
+    events = make_events(15, timedelta(hours=5), timedelta(hours=2), data, start)
+    queried: List[Tuple[datetime, datetime]] = []
+    awc = standin_server({"host": events}, queried)
+    classify._init_classes(new_classes=[("GitHub", "Programming", "Work")])
+    root = str(tmp_path)
+    end = start + timedelta(days=3)
+
+    assert import_events(awc, "host", start, end, root) == 15
+    assert import_events(awc, "host", start, end, root) == 0
+    assert len(queried) == 3
+
+    frame = load("host", start.date(), end.date(), root=root)
+    assert frame.column("$category_hierarchy").tolist() == [
+        e.data["$category_hierarchy"] for e in classify.classify(events)
+    ]
+    assert classify.time_per_category(frame)["Work"] == 8 * 2 * 3600
+
+    # Only the requested columns and days are read, memory-mapped
+    (day, frame), *_ = iter_days("host", start.date(), end.date(), ["title"], root)
+    assert list(frame.columns) == ["title"]
+    assert isinstance(frame.start.base, np.memmap)
+
+    # Chunks of the same day are compacted into one
+    day_dir = _day_dir(root, "host", start.date())
+    meta = {"since": start.isoformat(), "until": start.isoformat()}
+    frame = EventFrame.from_events(events[:1])
+    write_chunk(_next_chunk(day_dir), frame, {**meta, "rules_fingerprint": None})
+    assert len(_chunks(day_dir)) == 2
+    assert compact("host", root) == 1
+    assert len(_chunks(day_dir)) == 1
+    (path,) = _chunks(day_dir)
+    clf = classify.classifier
+    assert clf  # just to quiet typechecker, loaded above
+    assert _read_meta(path)["rules_fingerprint"] == clf.fingerprint
+    assert len(read_chunk(path)) == 6
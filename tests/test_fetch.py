@@ -0,0 +1,112 @@
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import List, Tuple
+
+from aw_core.models import Event
+
+from aw_research import classify
+from aw_research.classify import _get_events_segmented, get_events
+from aw_research.util import end_of_day, start_of_day
+
+
+def test_get_events_segmented(tmp_path, standin_server, make_events):
+    start = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    data = {"app": ["Firefox"], "title": [str(i) for i in range(15)]}
+    events = make_events(15, timedelta(hours=5), timedelta(hours=2), data, start)
+    events.append(
+        Event(timestamp=start + timedelta(hours=23), duration=timedelta(hours=2))
+    )
+    queried: List[Tuple[datetime, datetime]] = []
+    awc = standin_server({"host": events}, queried)
+    cache_dir = str(tmp_path)
+    end = start + timedelta(days=3)
+    result = _get_events_segmented(awc, "host", start, end, cache_dir)
+    assert sorted(queried) == [
+        (start + timedelta(i), start + timedelta(i + 1)) for i in range(3)
+    ]
+    # The event spanning midnight is split at the day bound
+    assert len(result) == 17
+    assert sum((e.duration for e in result), timedelta()) == timedelta(hours=32)
+
+    # Cached days are not fetched again, only the missing one
+    assert _get_events_segmented(awc, "host", start, end, cache_dir) == result
+    assert len(queried) == 3
+    overlapping = _get_events_segmented(
+        awc, "host", start + timedelta(days=1), end + timedelta(hours=1), cache_dir
+    )
+    assert queried[3:] == [(end, end + timedelta(days=1))]
+    assert overlapping == [e for e in result if e.timestamp >= start + timedelta(1)]
+
+    # The current day is open and fetched every time
+    now = datetime.now(timezone.utc)
+    _get_events_segmented(awc, "host", now, now, cache_dir)
+    _get_events_segmented(awc, "host", now, now, cache_dir)
+    assert queried[-2] == queried[-1] == (start_of_day(now), end_of_day(now))
+
+
+def test_get_events_hosts(tmp_path, caplog, standin_server, make_events):
+    start = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    events = {
+        host: make_events(
+            16,
+            timedelta(hours=3),
+            timedelta(hours=2),
+            {"app": [host]},
+            start + timedelta(hours=offset),
+        )
+        for host, offset in [("laptop", 0), ("desktop", 1)]
+    }
+    queried: List[Tuple[datetime, datetime]] = []
+    awc = standin_server(events, queried)
+    end = start + timedelta(days=2, hours=1)
+    caplog.set_level(logging.DEBUG)
+    merged = get_events(
+        awc,
+        ["laptop", "desktop"],
+        start,
+        end,
+        include_smartertime=None,
+        cache_dir=str(tmp_path),
+    )
+
+    # Each host is cached in its own segments, and timed separately
+    assert len(os.listdir(tmp_path)) == 2
+    assert "laptop: loaded 16 events" in caplog.text
+    assert "desktop: loaded 16 events" in caplog.text
+    # The desktop only fills the gaps of the laptop
+    for host, hours in [("laptop", 32), ("desktop", 16)]:
+        durations = (e.duration for e in merged if e.data["app"] == host)
+        assert sum(durations, timedelta()) == timedelta(hours=hours)
+    assert all(
+        e1.timestamp + e1.duration <= e2.timestamp
+        for e1, e2 in zip(merged[:-1], merged[1:])
+    )
+
+
+def test_time_per_category_incremental_get_events(
+    tmp_path, standin_server, make_events
+):
+    # Events cross midnight, so runs that end and start there split them
+    start = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    data = {"app": ["Firefox"], "title": ["GitHub"]}
+    events = make_events(
+        6, timedelta(days=1), timedelta(hours=2), data, start - timedelta(hours=1)
+    )
+    awc = standin_server({"host": events}, [])
+    classify._init_classes(new_classes=[("GitHub", "Programming", "Work")])
+
+    def fetch(since, end):
+        cache_dir = str(tmp_path / "cache")
+        return get_events(awc, "host", since, end, None, cache_dir=cache_dir)
+
+    def time_per_category(end, state_path):
+        return classify.time_per_category_incremental(
+            fetch, "host", start, end, str(tmp_path / state_path)
+        )
+
+    end = start + timedelta(days=5)
+    full = time_per_category(end, "full.json")
+    assert full["Work"] == 10 * 3600
+    time_per_category(start + timedelta(days=2), "incremental.json")
+    assert time_per_category(end, "incremental.json") == full
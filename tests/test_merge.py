@@ -0,0 +1,29 @@
+from datetime import datetime, timedelta, timezone
+
+from aw_core.models import Event
+
+from aw_research.merge import iter_merge_close_and_similar, merge_close_and_similar
+
+
+def test_merge_close_and_similar():
+    start = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    titles = ["Inbox (1) - Mail", "Inbox (2) - Mail", "Something else", "Other"]
+    events = [
+        Event(
+            timestamp=start + timedelta(seconds=15 * i),
+            duration=timedelta(seconds=10),
+            data={"app": "Firefox", "title": title},
+        )
+        for i, title in enumerate(titles)
+    ]
+    merged = merge_close_and_similar(events[::-1])
+    assert [e.data["title"] for e in merged] == [titles[0], *titles[2:]]
+    assert merged[0].duration == timedelta(seconds=25)
+
+    # The input is left as is, events that weren't merged are passed through
+    assert events[0].duration == timedelta(seconds=10)
+    assert merged[1] is events[2]
+
+    stream = iter_merge_close_and_similar(iter(events))
+    assert next(stream).duration == timedelta(seconds=25)
+    assert merge_close_and_similar([]) == []